@@ -0,0 +1,54 @@
+import math
+
+
+# two-sided 95 % Student t quantiles by degrees of freedom, a few sweeps are far from the normal 1.96
+_t95 = [
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+]
+
+
+def t95(df):
+    if df <= len(_t95):
+        return _t95[df - 1]
+    # past 30 degrees of freedom the quantile closes in on the normal one as 1.96 + 2.4 / df
+    return 1.96 + 2.4 / df
+
+
+class AdaptiveAverage:
+    def __init__(self, size, tolerance, cap, min_count=4):
+        self._tolerance = tolerance
+        self._cap = max(int(cap), 1)
+        self._min_count = min(min_count, self._cap)
+
+        self.count = 0
+        self._means = [0.0] * size
+        self._m2 = [0.0] * size
+
+    def add(self, values):
+        # Welford's online mean and variance, one accumulator per tone
+        self.count += 1
+        for i, v in enumerate(values):
+            delta = v - self._means[i]
+            self._means[i] += delta / self.count
+            self._m2[i] += delta * (v - self._means[i])
+
+    @property
+    def means(self):
+        return list(self._means)
+
+    @property
+    def half_widths(self):
+        if self.count < 2:
+            return [math.inf] * len(self._means)
+        t = t95(self.count - 1)
+        return [t * math.sqrt(m2 / (self.count - 1) / self.count) for m2 in self._m2]
+
+    @property
+    def done(self):
+        if self.count >= self._cap:
+            return True
+        if self.count < self._min_count:
+            return False
+        return all(hw <= self._tolerance for hw in self.half_widths)
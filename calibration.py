@@ -0,0 +1,87 @@
+import datetime
+
+
+def calibration_meta(pow_values, freq_values, idns, secondary):
+    now = datetime.datetime.now().isoformat()
+    return {
+        'created': now,
+        'timestamp': now,
+        'pow': list(pow_values),
+        'freq': list(freq_values),
+        'idn': dict(idns) if idns else None,
+        'is_Flo_div2': secondary['is_Flo_div2'],
+        'analyzer': {
+            'sa_span': secondary['sa_span'],
+            'sa_rlev': secondary['sa_rlev'],
+            'sa_scale_y': secondary['sa_scale_y'],
+        },
+    }
+
+
+def check_calibration(stored, current, max_age_days):
+    """Return the reasons the stored calibration can't be reused for the current setup, empty if it can.
+
+    A grid extension is not a reason, missing points are measured on top of the stored ones.
+    """
+    if not stored:
+        return ['no calibration metadata']
+
+    issues = list()
+    if current.get('idn') and stored.get('idn') != current['idn']:
+        issues.append(f'instruments changed: {stored.get("idn")} -> {current["idn"]}')
+    if stored.get('is_Flo_div2') != current['is_Flo_div2']:
+        issues.append('LO frequency divider changed')
+    if stored.get('analyzer') != current['analyzer']:
+        issues.append(f'analyzer settings changed: {stored.get("analyzer")} -> {current["analyzer"]}')
+
+    age = datetime.datetime.now() - datetime.datetime.fromisoformat(stored['timestamp'])
+    if age > datetime.timedelta(days=max_age_days):
+        issues.append(f'calibration is {age.days} days old')
+    return issues
+
+
+def rf_table(cal_rf):
+    """The `{analyzer freq: loss}` RF path table, empty for the older per LO power tables keyed by generator freq."""
+    if any(isinstance(v, dict) for v in cal_rf.values()):
+        return dict()
+    return cal_rf
+
+
+def missing_freqs(cal_lo, cal_rf, pow_values, freqs, freqs_sa):
+    # the LO table is keyed by generator frequency, the RF one by the paired analyzer frequency
+    return [
+        f for f, f_sa in zip(freqs, freqs_sa)
+        if f_sa not in cal_rf or any(f not in cal_lo.get(p, {}) for p in pow_values)
+    ]
+
+
+def spot_indices(n, count):
+    # evenly spread, both band edges included
+    if n <= count:
+        return list(range(n))
+    return sorted({round(i * (n - 1) / (count - 1)) for i in range(count)})
+
+
+def drifted(old, new, tolerance):
+    """Frequencies at which any power of the new `{pow: {freq: loss}}` table moved beyond tolerance."""
+    return sorted({
+        f for p, row in new.items() for f, loss in row.items()
+        if abs(loss - old.get(p, {}).get(f, loss)) > tolerance
+    })
+
+
+def drifted_rf(old, new, tolerance):
+    """Frequencies at which the new `{freq: loss}` RF path table moved beyond tolerance."""
+    return sorted(f for f, loss in new.items() if abs(loss - old.get(f, loss)) > tolerance)
+
+
+def drift_regions(freqs, spots, drifted_spots):
+    # everything between the neighbouring spot points of a drifted one has to be re-measured
+    regions = set()
+    for i, spot in enumerate(spots):
+        if freqs[spot] not in drifted_spots:
+            continue
+        start = spots[i - 1] + 1 if i > 0 else 0
+        stop = spots[i + 1] if i < len(spots) - 1 else len(freqs)
+        regions.update(freqs[j] for j in range(start, stop) if j != spot)
+    return sorted(regions)
@@ -0,0 +1,195 @@
+import datetime
+import math
+import time
+
+import numpy as np
+
+from instr.const import GIGA
+
+
+# first guesses per transition in seconds, replaced by what the bench shows once a run is learned
+default_costs = {
+    'setup': 2.0,                # per run
+    'retune': 0.05,              # LO power and frequency writes, output toggles, per point
+    'analyzer': 0.03,            # analyzer center frequency writes, per point
+    'readout': 0.25,             # four marker reads and the supply current, per analyzer sweep
+    'readout_zero_span': 0.4,    # four zero span sweeps and the supply current, per averaging pass
+    'process': 0.005,            # point processing on the sweep thread, per point
+    'axis': 0.05,                # extra sweep axis writes, per axes point
+    'spur_trace': 1.0,           # one spur search chunk
+}
+
+# learned costs move this far towards every new run, so a single odd run does not take over
+learn_rate = 0.5
+
+
+def sweep_grid(secondary):
+    """LO power and frequency values of the sweep, the way the measurement builds them."""
+    lo_pow_start = secondary['Plo_min']
+    lo_pow_end = secondary['Plo_max']
+    lo_f_start = secondary['Flo_min'] * GIGA
+    lo_f_end = secondary['Flo_max'] * GIGA
+
+    pow_lo_values = [
+        round(x, 3) for x in
+        np.arange(start=lo_pow_start, stop=lo_pow_end + 0.002, step=secondary['Plo_delta'])
+    ] if lo_pow_start != lo_pow_end else [lo_pow_start]
+
+    freq_lo_values = [
+        round(x, 3) for x in
+        np.arange(start=lo_f_start, stop=lo_f_end + 0.0001, step=secondary['Flo_delta'] * GIGA)
+    ]
+    return pow_lo_values, freq_lo_values
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f'{seconds} с'
+    if seconds < 3600:
+        return f'{seconds // 60} мин {seconds % 60:02} с'
+    return f'{seconds // 3600} ч {seconds % 3600 // 60:02} мин'
+
+
+class Estimate:
+    def __init__(self, points, setup, per_point, soak_hours=None):
+        self.points = points
+        self.setup = setup
+        self.per_point = per_point
+        self.soak_hours = soak_hours
+
+    @property
+    def seconds(self):
+        if self.soak_hours:
+            return self.soak_hours * 3600
+        return self.setup + self.points * self.per_point
+
+    def __str__(self):
+        if self.soak_hours is not None:
+            pass_time = format_duration(self.setup + self.points * self.per_point)
+            total = format_duration(self.seconds) if self.soak_hours else 'до отмены'
+            return f'Точек за проход: {self.points}, проход ~{pass_time}, прогон {total}'
+        return f'Точек: {self.points}, оценка времени ~{format_duration(self.seconds)}'
+
+
+class DurationModel:
+    """Per transition costs learned from profiled runs, settle waits come from the timing profile.
+
+    A point costs its retune, analyzer retune and readout plus the settle times the sweep waits,
+    averaging multiplies the readout by the number of analyzer sweeps.
+    """
+
+    def __init__(self, costs=None, avg_fill=1.0, runs=0):
+        self.costs = {**default_costs, **(costs or {})}
+        self.avg_fill = avg_fill
+        self.runs = runs
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('costs'), data.get('avg_fill', 1.0), data.get('runs', 0))
+
+    def to_dict(self):
+        return {
+            'updated': datetime.datetime.now().isoformat(),
+            'runs': self.runs,
+            'avg_fill': self.avg_fill,
+            'costs': self.costs,
+        }
+
+    def _sweeps(self, secondary):
+        # software averaging stops early once readings converge, the fill is what earlier runs needed
+        if secondary['sa_avg_adaptive']:
+            return max(1.0, secondary['sa_avg_count'] * self.avg_fill)
+        return 1.0
+
+    def estimate(self, secondary, timing):
+        pow_lo_values, freq_lo_values = sweep_grid(secondary)
+        combos = math.prod(len(v) for v in secondary['sweep_axes'].values()) if secondary['sweep_axes'] else 1
+        grid = len(pow_lo_values) * len(freq_lo_values)
+        points = grid * combos
+
+        zero_span = secondary['sa_zero_span'] and not secondary['mod_tones']
+        sweeps = self._sweeps(secondary)
+        freqs_gen = [f * 2 if secondary['is_Flo_div2'] else f for f in freq_lo_values]
+
+        # settle times depend on the band, averaged over the grid frequencies
+        settle = sum(timing.delay('retune', f) for f in freqs_gen)
+        if not zero_span:
+            settle += sum(timing.delay('analyzer', f) + 4 * sweeps * timing.delay('marker', f) for f in freq_lo_values)
+        settle /= max(1, len(freq_lo_values))
+
+        per_point = self.costs['retune'] + settle
+        if zero_span:
+            per_point += sweeps * self.costs['readout_zero_span']
+        else:
+            per_point += self.costs['analyzer'] + sweeps * self.costs['readout']
+        if not secondary['pipelined']:
+            per_point += self.costs['process']
+
+        # a multi-tone point reports one point per modulation tone from the same acquisition
+        tones = len(secondary['mod_tones']) or 1
+        points *= tones
+        per_point /= tones
+
+        setup = self.costs['setup'] + 0.5
+        if combos > 1:
+            setup += combos * self.costs['axis'] + (combos - 1) * 0.6
+        if secondary['spur_search']:
+            chunks = math.ceil((secondary['spur_stop'] - secondary['spur_start']) * 1000 / secondary['spur_chunk'])
+            spur_points = len(secondary['spur_points']) or 3
+            setup += combos * spur_points * chunks * self.costs['spur_trace']
+
+        return Estimate(
+            points, setup, per_point,
+            soak_hours=secondary['soak_hours'] if secondary['soak'] else None,
+        )
+
+    def learn(self, phases, points, sweeps, combos, spur_traces, zero_span, avg_fill=None):
+        """Update the costs from the phase totals of a finished profiled run."""
+        if not points:
+            return
+        readout = 'readout_zero_span' if zero_span else 'readout'
+        observed = {
+            'setup': (phases.get('setup'), 1),
+            'retune': (phases.get('retune'), points),
+            'analyzer': (None if zero_span else phases.get('analyzer'), points),
+            readout: (phases.get('readout'), sweeps),
+            'process': (phases.get('process'), points),
+            'axis': (phases.get('axis'), combos),
+            'spur_trace': (phases.get('spurs'), spur_traces),
+        }
+        for key, (total, count) in observed.items():
+            if total is None or not count:
+                continue
+            cost = total / count
+            old = self.costs[key] if self.runs else cost
+            self.costs[key] = round(old + learn_rate * (cost - old), 5)
+        if avg_fill is not None:
+            self.avg_fill = round(self.avg_fill + learn_rate * (avg_fill - self.avg_fill), 3)
+        self.runs += 1
+
+
+class RunClock:
+    """Remaining time of a running sweep, the estimate scaled by how fast the run actually goes."""
+
+    def __init__(self, estimate):
+        self._estimate = estimate
+        self._started = time.monotonic()
+        self._done = 0
+
+    def point_done(self):
+        self._done += 1
+        elapsed = time.monotonic() - self._started
+        estimate = self._estimate
+        if estimate.soak_hours is not None:
+            left = estimate.seconds - elapsed if estimate.soak_hours else None
+            point = (self._done - 1) % estimate.points + 1
+            text = f'Проход {(self._done - 1) // estimate.points + 1}, точка {point} из {estimate.points}'
+            return text if left is None else f'{text}, осталось ~{format_duration(max(0.0, left))}'
+
+        # trust the measured pace more as points come in, the first few carry the setup time
+        predicted = estimate.setup + self._done * estimate.per_point
+        weight = self._done / (self._done + 10)
+        pace = 1 + weight * (elapsed / predicted - 1) if predicted > 0 else 1
+        left = max(0, estimate.points - self._done) * estimate.per_point * pace
+        return f'Точка {self._done} из {estimate.points}, осталось ~{format_duration(left)}'
@@ -0,0 +1,229 @@
+import math
+import multiprocessing as mp
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+ring_fields = (
+    'index', 'lo_p', 'lo_f', 'src_u', 'src_i', 'src_i_min', 'src_i_max',
+    'sa_p_out', 'sa_p_carr', 'sa_p_sb', 'sa_p_3_harm',
+    'loss', 'rf_loss', 'avg_count', 'tone_level',
+    'Fmod', 'Umod', 'Uoffs', 'Usrc', 'UsrcD', 'pass',
+)
+_int_fields = {'index', 'avg_count', 'pass'}
+
+
+class PointRing:
+    """Single writer ring of raw points in shared memory.
+
+    The first row holds the write counter, the rest are `capacity` rows of `ring_fields`.
+    Readers in another process map the same block and see new rows without copying.
+    """
+
+    def __init__(self, capacity=4096, name=None):
+        size = (capacity + 1) * len(ring_fields) * 8
+        self._owner = name is None
+        self._shm = shared_memory.SharedMemory(name=name, create=self._owner, size=size)
+        self._buf = np.ndarray((capacity + 1, len(ring_fields)), dtype=np.float64, buffer=self._shm.buf)
+        if self._owner:
+            self._buf[:] = np.nan
+            self._buf[0, 0] = 0
+        self.capacity = capacity
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def written(self):
+        return int(self._buf[0, 0])
+
+    def write(self, point):
+        count = self.written
+        self._buf[1 + count % self.capacity] = [point.get(f, math.nan) for f in ring_fields]
+        # publish the row only after it is complete
+        self._buf[0, 0] = count + 1
+
+    def rows(self, since):
+        """Rows written after `since` and the new read position, a view into shared memory when contiguous."""
+        count = self.written
+        if count - since > self.capacity:
+            print(f'engine ring overrun, {count - since - self.capacity} points lost')
+            since = count - self.capacity
+        start = since % self.capacity
+        stop = start + (count - since)
+        if stop <= self.capacity:
+            return self._buf[1 + start:1 + stop], count
+        return np.concatenate([self._buf[1 + start:], self._buf[1:1 + stop - self.capacity]]), count
+
+    def close(self):
+        self._buf = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+def row_to_point(row):
+    return {
+        f: int(v) if f in _int_fields else float(v)
+        for f, v in zip(ring_fields, row) if not math.isnan(v)
+    }
+
+
+class _EventToken:
+    def __init__(self, event):
+        self._event = event
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    @cancelled.setter
+    def cancelled(self, value):
+        if value:
+            self._event.set()
+        else:
+            self._event.clear()
+
+    def wait(self, timeout):
+        return self._event.wait(timeout)
+
+
+def _engine_main(addrs, ring_name, capacity, control, cancel):
+    # runs in the engine process, owns the instruments and the sweep
+    ring = None
+    try:
+        from instrumentcontroller import InstrumentController
+
+        ring = PointRing(capacity, name=ring_name)
+
+        class _EngineController(InstrumentController):
+            def _add_measure_point(self, data):
+                super()._add_measure_point(data)
+                ring.write(data)
+
+        controller = _EngineController()
+        controller.load_configs()
+        controller.connect(addrs)
+        control.send(('connected', controller.found))
+
+        while True:
+            command, *args = control.recv()
+            if command == 'quit':
+                break
+            if command == 'measure':
+                device, secondary = args
+                cancel.clear()
+                controller.secondaryParams.update(secondary)
+                controller.secondaryParams['engine_process'] = False
+                # the GUI process stores the run from the points it got back
+                controller.secondaryParams['store_results'] = False
+                controller.secondaryParams['soak_stream'] = False
+                # the GUI process already publishes the points it gets back on the live stream port
+                controller.secondaryParams['live_stream'] = False
+                controller.load_calibration()
+                controller.hasResult = False
+                controller.measure(_EventToken(cancel), [device, None])
+                control.send(('finished', controller.hasResult, controller.result.verdict))
+    except Exception as ex:
+        # whatever killed the engine, the GUI process must get an answer instead of waiting forever
+        print('engine process error:', repr(ex))
+        try:
+            control.send(('error', repr(ex)))
+        except (OSError, EOFError):
+            pass
+    finally:
+        if ring is not None:
+            ring.close()
+
+
+class EngineClient:
+    def __init__(self, capacity=4096):
+        self._capacity = capacity
+        self._ring = None
+        self._control = None
+        self._cancel = None
+        self._process = None
+
+    @property
+    def running(self):
+        return self._process is not None and self._process.is_alive()
+
+    def start(self, addrs):
+        ctx = mp.get_context('spawn')
+        self._ring = PointRing(self._capacity)
+        self._control, child_control = ctx.Pipe()
+        self._cancel = ctx.Event()
+        self._process = ctx.Process(
+            target=_engine_main,
+            args=(addrs, self._ring.name, self._capacity, child_control, self._cancel),
+            daemon=True,
+        )
+        self._process.start()
+        # only the child holds its end now, so its death shows up here as EOFError
+        child_control.close()
+
+        reply = self._wait_reply()
+        if reply is None or reply[0] == 'error':
+            self.stop()
+            raise RuntimeError(f'engine process failed to start: {reply[1] if reply else "died"}')
+        if not reply[1]:
+            self.stop()
+            raise RuntimeError('engine process could not find instruments')
+
+    def _wait_reply(self, on_poll=None):
+        """Next control message, None once the engine process is gone."""
+        while True:
+            try:
+                if self._control.poll(0.02):
+                    return self._control.recv()
+            except (EOFError, OSError):
+                return None
+            if not self._process.is_alive():
+                # it may have answered right before exiting
+                try:
+                    return self._control.recv() if self._control.poll() else None
+                except (EOFError, OSError):
+                    return None
+            if on_poll is not None:
+                on_poll()
+
+    def measure(self, device, secondary, token, on_point):
+        since = self._ring.written
+        self._control.send(('measure', device, secondary))
+
+        def on_poll():
+            nonlocal since
+            if token.cancelled:
+                self._cancel.set()
+            rows, since = self._ring.rows(since)
+            for row in rows:
+                on_point(row_to_point(row))
+
+        reply = self._wait_reply(on_poll)
+        # points written right before the reply
+        on_poll()
+        if reply is None or reply[0] == 'error':
+            print('engine process failed:', reply[1] if reply else 'process died')
+            self.stop()
+            return False, None
+
+        _, has_result, verdict = reply
+        return has_result, verdict
+
+    def stop(self):
+        if self._process is not None:
+            if self._process.is_alive():
+                try:
+                    self._control.send(('quit', ))
+                except OSError:
+                    pass
+                self._process.join(timeout=5)
+                if self._process.is_alive():
+                    self._process.terminate()
+            self._process = None
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
@@ -0,0 +1,134 @@
+import ast
+import sys
+
+import numpy as np
+
+from measureresult import MeasureResult
+
+
+golden_params = ['kp_out', 'ap_carr', 'a_sb', 'a_3h']
+
+default_tolerance = {
+    'kp_out': 0.5,
+    'ap_carr': 1.0,
+    'a_sb': 1.0,
+    'a_3h': 2.0,
+}
+
+
+def process_raw(raw_points, adjustment=None):
+    """Raw sweep points as MeasureResult reports, adjusted the way the live points are."""
+    result = MeasureResult()
+    result.adjustment = adjustment
+    for point in raw_points:
+        result.add_point({'loss': 0, **point})
+    return result.points
+
+
+def load_raw(file_name):
+    with open(file_name, mode='rt', encoding='utf-8') as f:
+        return ast.literal_eval(f.read())
+
+
+class GoldenComparison:
+    def __init__(self, reference, deltas, fails, found):
+        self.reference = reference
+        self.deltas = deltas
+        self.fails = fails
+        self.found = found
+
+    @property
+    def passed(self):
+        return not self.fails.any()
+
+    @property
+    def verdict(self):
+        return GoldenReference.verdict(int(self.found.sum()), int(self.fails.any(axis=1).sum()))
+
+    def worst(self):
+        # largest deviation relative to the tolerance per parameter
+        ratio = np.abs(self.deltas[self.found]) / self.reference.tolerance[self.found]
+        if not len(ratio):
+            return {}
+        return {p: float(np.nanmax(ratio[:, k])) for k, p in enumerate(self.reference.params)}
+
+
+class GoldenReference:
+    """Reports of a golden unit over the grid with a tolerance per point and parameter.
+
+    A tolerance is either a number for the whole band or a list of `[f_from, f_to, tolerance]`
+    frequency ranges in GHz, points outside every range are not checked.
+    """
+
+    def __init__(self, reports, tolerances=None, params=None):
+        self.params = list(params or golden_params)
+        self.keys = [(r['lo_p'], r['lo_f']) for r in reports]
+        self._index = {k: i for i, k in enumerate(self.keys)}
+        self.values = np.array([[r[p] for p in self.params] for r in reports], dtype=np.float64)
+
+        tolerances = {**default_tolerance, **(tolerances or {})}
+        freqs = np.array([f for _, f in self.keys], dtype=np.float64)
+        self.tolerance = np.column_stack([_tolerance_mask(tolerances.get(p, np.inf), freqs) for p in self.params])
+
+    @classmethod
+    def from_file(cls, file_name, tolerances=None, adjustment=None):
+        return cls(process_raw(load_raw(file_name), adjustment), tolerances)
+
+    @staticmethod
+    def verdict(found, failed):
+        if not found:
+            return 'нет общих точек с эталоном'
+        if not failed:
+            return 'соответствует эталону'
+        return f'отличие от эталона в {failed} из {found} точек'
+
+    def check(self, report):
+        """Deltas of a single report as `{param: (delta, passed)}`, None for a point not in the reference."""
+        i = self._index.get((report['lo_p'], report['lo_f']))
+        if i is None:
+            return None
+        return {
+            p: (report[p] - self.values[i, k], abs(report[p] - self.values[i, k]) <= self.tolerance[i, k])
+            for k, p in enumerate(self.params)
+        }
+
+    def compare(self, reports):
+        got = np.full_like(self.values, np.nan)
+        for r in reports:
+            i = self._index.get((r['lo_p'], r['lo_f']))
+            if i is not None:
+                got[i] = [r[p] for p in self.params]
+
+        found = ~np.isnan(got).all(axis=1)
+        deltas = got - self.values
+        with np.errstate(invalid='ignore'):
+            fails = np.abs(deltas) > self.tolerance
+        return GoldenComparison(self, deltas, fails, found)
+
+    def curves(self, param):
+        """Reference value and tolerance per LO power as `{lo_p: (freqs, values, tolerances)}`, for plotting."""
+        k = self.params.index(param)
+        curves = dict()
+        for i, (lo_p, lo_f) in enumerate(self.keys):
+            curves.setdefault(lo_p, ([], [], []))
+            for column, value in zip(curves[lo_p], [lo_f, self.values[i, k], self.tolerance[i, k]]):
+                column.append(value)
+        return {lo_p: tuple(np.array(c) for c in columns) for lo_p, columns in curves.items()}
+
+
+def _tolerance_mask(tolerance, freqs):
+    if np.isscalar(tolerance):
+        return np.full(len(freqs), float(tolerance))
+    mask = np.full(len(freqs), np.inf)
+    for f_from, f_to, value in tolerance:
+        mask[(freqs >= f_from) & (freqs <= f_to)] = value
+    return mask
+
+
+if __name__ == '__main__':
+    # python goldenunit.py mock_data/-10+0db_basline.txt mock_data/-10+0db_untuned.txt mock_data/-10+0db_live.txt ...
+    golden = GoldenReference.from_file(sys.argv[1])
+    for run in sys.argv[2:]:
+        comparison = golden.compare(process_raw(load_raw(run)))
+        worst = ', '.join(f'{p} {v:0.1f}' for p, v in comparison.worst().items())
+        print(f'{run}: {comparison.verdict}; worst deviation / tolerance: {worst}')
@@ -1,3 +1,8 @@
+import glob
+import os
 import subprocess
 
+for ui_file in glob.glob('*.ui'):
+    subprocess.run(['pyuic5', ui_file, '-o', f'ui_{os.path.splitext(ui_file)[0]}.py'])
+
 subprocess.run(['pyinstaller', '--onedir', 'measure.py', '--clean'])
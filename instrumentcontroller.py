@@ -1,4 +1,7 @@
 import ast
+import datetime
+import itertools
+import os
 import time
 
 import numpy as np
@@ -8,12 +11,36 @@ from PyQt5.QtCore import QObject, pyqtSlot, pyqtSignal
 
 from instr.const import *
 from instr.instrumentfactory import mock_enabled, GeneratorFactory, SourceFactory, MultimeterFactory, AnalyzerFactory
+from adaptiveaverage import AdaptiveAverage
+from durationestimate import DurationModel, RunClock, sweep_grid
+from calibration import calibration_meta, check_calibration, missing_freqs, rf_table, spot_indices, drifted, drifted_rf, \
+    drift_regions
 from measureresult import MeasureResult
+from resultcube import ordered_axes
+from speclimits import SpecLimits, ProductionJudge, screening_order
+from sweeppipeline import SweepPipeline, InlinePipeline
+from sweepprofiler import SweepProfiler, PhaseTimer, NullProfiler
+from scpibatch import ScpiBatcher, NullBatcher
+from scpitrace import TraceRecorder, TraceReplay, NullRecorder
+from zerospan import ZeroSpanReader, tone_fields
+from multitone import MultiToneWaveform, collisions, tone_groups, trace_levels, upload_if_missing
+from settletiming import TimingProfile, band_of, convergence_time, default_delays, timing_identity
 from forgot_again.file import load_ast_if_exists, pprint_to_file
 
 
+def _read_calibration():
+    cal = load_ast_if_exists('cal.ini', default={})
+    return (
+        cal.get('lo', None) or load_ast_if_exists('cal_lo.ini', default={}),
+        rf_table(cal.get('rf', None) or load_ast_if_exists('cal_rf.ini', default={})),
+        cal.get('meta', {}),
+    )
+
+
 class InstrumentController(QObject):
     pointReady = pyqtSignal()
+    configsLoaded = pyqtSignal(dict)
+    estimateChanged = pyqtSignal(str)
 
     def __init__(self, parent=None):
         super().__init__(parent=parent)
@@ -49,7 +76,7 @@ class InstrumentController(QObject):
             },
         }
 
-        self.secondaryParams = load_ast_if_exists('params.ini', default={
+        self.secondaryParams = {
             'Plo_min': -10.0,
             'Plo_max': 0.0,
             'Plo_delta': 5.0,
@@ -69,10 +96,63 @@ class InstrumentController(QObject):
             'sa_span': 10.0,   # MHz
             'sa_avg_state': True,
             'sa_avg_count': 16,
-        })
+            'sa_avg_adaptive': False,
+            'sa_avg_tol': 0.1,   # dB
+            'prod_mode': False,
+            'prod_screen_first': False,
+            'prod_sigma': 0.2,   # dB
+            'prod_confidence': 0.997,
+            'profile': False,
+            'profile_live': False,
+            'estimate_learn': True,   # time the sweep phases of every run to learn the duration estimate costs
+            'trace_record': False,
+            'trace_replay': False,
+            'trace_replay_realtime': False,
+            'cal_incremental': True,
+            'cal_spot_count': 8,
+            'cal_tolerance': 0.3,   # dB
+            'cal_max_age': 30,   # days
+            'live_stream': False,
+            'live_port': 8765,
+            'engine_process': False,
+            'sweep_axes': {},   # extra axes, e.g. {'Usrc': [4.75, 5.0, 5.25]}
+            'mult_buffered': False,
+            'mult_nplc': 1,
+            'mult_samples': 10,
+            'sa_zero_span': False,
+            'mod_tones': [],   # MHz, several Fmod played at once from a synthesized waveform, empty for the stored tone
+            'pipelined': False,
+            'scpi_batch': False,
+            'scpi_batch_limit': 256,
+            'scpi_batch_check': True,
+            'store_results': True,
+            'dut_serial': '',
+            'dut_lot': '',
+            'operator': '',
+            'temperature': 25,
+            'soak': False,
+            'soak_hours': 24,   # 0 runs until cancelled
+            'soak_params': ['kp_out', 'src_i'],
+            'soak_stream': True,
+            'spur_search': False,
+            'spur_points': [],   # [[lo_p, lo_f GHz], ...], empty for band edges and center at max power
+            'spur_start': 0.01,   # GHz
+            'spur_stop': 6.0,   # GHz
+            'spur_chunk': 500,   # MHz
+            'spur_sweep_points': 1001,
+            'spur_rbw': 100,   # kHz
+            'spur_threshold': 10,   # dB above the noise floor
+            'golden_ref': '',   # raw points file of the golden unit, e.g. mock_data/-10+0db_live3.txt
+            'golden_tolerance': {},   # {param: dB or [[f_from_GHz, f_to_GHz, dB], ...]}
+            'cal_timing': False,
+            'timing_tolerance': 0.1,
+            'timing_margin': 1.2,
+        }
 
-        self._calibrated_pows_lo = load_ast_if_exists('cal_lo.ini', default={})
-        self._calibrated_pows_rf = load_ast_if_exists('cal_rf.ini', default={})
+        self._calibrated_pows_lo = dict()
+        self._calibrated_rf = dict()
+        self._calibration_meta = dict()
+        self._configs_loaded = False
 
         self._instruments = dict()
         self.found = False
@@ -81,10 +161,54 @@ class InstrumentController(QObject):
         self.only_main_states = False
 
         self.result = MeasureResult()
+        self._screening_reference = dict()
+        self._profiler = NullProfiler()
+        self._batch = NullBatcher()
+        self._recorder = NullRecorder()
+        self._replay = None
+        self._token = None
+        self._publisher = None
+        self._engine = None
+        self._timing = TimingProfile()
+        self._store = None
+        self._run_device = None
+        self._run_started = None
+        self._run_id = None
+        self._durations = DurationModel()
+        self._clock = None
 
     def __str__(self):
         return f'{self._instruments}'
 
+    @staticmethod
+    def read_configs():
+        # only reads the files, safe off the GUI thread, apply_configs() puts them in place
+        return {
+            'params': load_ast_if_exists('params.ini', default={}),
+            'cal': _read_calibration(),
+            'timing': load_ast_if_exists('timing.ini', default={}),
+            'duration': load_ast_if_exists('duration.ini', default={}),
+        }
+
+    def emit_configs(self):
+        # the signal hands the data over to the GUI thread
+        self.configsLoaded.emit(self.read_configs())
+
+    def apply_configs(self, configs):
+        self.secondaryParams.update(configs['params'])
+        self._calibrated_pows_lo, self._calibrated_rf, self._calibration_meta = configs['cal']
+        self._timing = TimingProfile.from_dict(configs['timing'])
+        self._durations = DurationModel.from_dict(configs['duration'])
+
+        self._configs_loaded = True
+        self._emit_estimate()
+
+    def load_configs(self):
+        self.apply_configs(self.read_configs())
+
+    def load_calibration(self):
+        self._calibrated_pows_lo, self._calibrated_rf, self._calibration_meta = _read_calibration()
+
     def connect(self, addrs):
         print(f'searching for {addrs}')
         for k, v in addrs.items():
@@ -114,18 +238,14 @@ class InstrumentController(QObject):
 
     def _calibrateLO(self, token, secondary):
         print('run calibrate LO with', secondary)
+        self._token = token
 
         gen_lo = self._instruments['P LO']
         sa = self._instruments['Анализатор']
 
         secondary = self.secondaryParams
 
-        lo_pow_start = secondary['Plo_min']
-        lo_pow_end = secondary['Plo_max']
-        lo_pow_step = secondary['Plo_delta']
         lo_f_start = secondary['Flo_min'] * GIGA
-        lo_f_end = secondary['Flo_max'] * GIGA
-        lo_f_step = secondary['Flo_delta'] * GIGA
 
         lo_f_is_div2 = secondary['is_Flo_div2']
 
@@ -133,10 +253,7 @@ class InstrumentController(QObject):
         sa_scale_y = secondary['sa_scale_y']
         sa_span = secondary['sa_span'] * MEGA
 
-        pow_lo_values = [round(x, 3) for x in np.arange(start=lo_pow_start, stop=lo_pow_end + 0.002, step=lo_pow_step)] \
-            if lo_pow_start != lo_pow_end else [lo_pow_start]
-        freq_lo_values = [round(x, 3) for x in
-                          np.arange(start=lo_f_start, stop=lo_f_end + 0.0001, step=lo_f_step)]
+        pow_lo_values, freq_lo_values = sweep_grid(secondary)
 
         sa.send(':CAL:AUTO OFF')
         sa.send(':SENS:FREQ:SPAN 1MHz')
@@ -151,75 +268,321 @@ class InstrumentController(QObject):
         sa.send(f'DISP:WIND:TRAC:Y:PDIV {sa_scale_y}')
 
         result = defaultdict(dict)
-        for pow_lo in pow_lo_values:
-            gen_lo.send(f'SOUR:POW {pow_lo}dbm')
+        try:
+            for pow_lo in pow_lo_values:
+                gen_lo.send(f'SOUR:POW {pow_lo}dbm')
 
-            for freq in freq_lo_values:
+                for freq in freq_lo_values:
 
-                freq_gen = freq
-                if lo_f_is_div2:
-                    freq_gen *= 2
+                    freq_gen = freq
+                    if lo_f_is_div2:
+                        freq_gen *= 2
 
-                if token.cancelled:
-                    gen_lo.send(f'OUTP:STAT OFF')
-                    time.sleep(0.5)
+                    if token.cancelled:
+                        raise RuntimeError('calibration cancelled')
 
                     gen_lo.send(f'SOUR:POW {pow_lo}dbm')
+                    gen_lo.send(f'SOUR:FREQ {freq_gen}Hz')
 
-                    gen_lo.send(f'SOUR:FREQ {lo_f_start}GHz')
-                    raise RuntimeError('calibration cancelled')
+                    gen_lo.send(f'OUTP:STAT ON')
+                    gen_lo.send(f':RAD:ARB ON')
 
-                gen_lo.send(f'SOUR:POW {pow_lo}dbm')
-                gen_lo.send(f'SOUR:FREQ {freq_gen}Hz')
+                    self._settle(0.5)
 
-                gen_lo.send(f'OUTP:STAT ON')
-                gen_lo.send(f':RAD:ARB ON')
+                    sa.send(f':SENSe:FREQuency:CENTer {freq_gen}Hz')
 
-                if not mock_enabled:
-                    time.sleep(0.5)
+                    self._settle(0.5)
 
-                sa.send(f':SENSe:FREQuency:CENTer {freq_gen}Hz')
+                    sa.send(f':CALCulate:MARKer1:X {freq_gen}Hz')
+                    pow_read = float(sa.query(':CALCulate:MARKer:Y?'))
+                    loss = abs(pow_lo - pow_read)
+                    if mock_enabled:
+                        loss = 10
 
-                if not mock_enabled:
-                    time.sleep(0.5)
-
-                sa.send(f':CALCulate:MARKer1:X {freq_gen}Hz')
-                pow_read = float(sa.query(':CALCulate:MARKer:Y?'))
-                loss = abs(pow_lo - pow_read)
-                if mock_enabled:
-                    loss = 10
-
-                print('loss: ', loss)
-                result[pow_lo][freq_gen] = loss
+                    print('loss: ', loss)
+                    result[pow_lo][freq_gen] = loss
+        except RuntimeError:
+            gen_lo.send(f'OUTP:STAT OFF')
+            self._settle(0.5, cancellable=False)
+            gen_lo.send(f'SOUR:FREQ {lo_f_start}Hz')
+            sa.send(':CAL:AUTO ON')
+            raise
 
         result = {k: v for k, v in result.items()}
-        pprint_to_file('cal_lo.ini', result)
 
         gen_lo.send(f'OUTP:STAT OFF')
         sa.send(':CAL:AUTO ON')
         self._calibrated_pows_lo = result
+        # an LO-only pass leaves the RF table behind, the next combined run has to start over
+        self._calibration_meta = dict()
+        self._save_calibration()
         return True
 
     def _calibrateRF(self, token, secondary):
-        print('run empty calibrate RF')
+        # RF path is characterized in the same pass as LO, there is no point in walking the grid twice
+        return self._calibrate(token, secondary)
+
+    def _calibrate(self, token, secondary):
+        print('run combined calibrate LO + RF with', secondary)
+        self._token = token
 
-        result = dict()
-        pprint_to_file('cal_rf.ini', result)
+        gen_lo = self._instrument('P LO')
+        gen_mod = self._instrument('P MOD')
+        sa = self._instrument('Анализатор')
+
+        secondary = self.secondaryParams
+
+        lo_f_start = secondary['Flo_min'] * GIGA
+
+        lo_f_is_div2 = secondary['is_Flo_div2']
 
-        self._calibrated_pows_rf = result
+        sa_rlev = secondary['sa_rlev']
+        sa_scale_y = secondary['sa_scale_y']
+        sa_span = secondary['sa_span'] * MEGA
+
+        pow_lo_values, freq_lo_values = sweep_grid(secondary)
+
+        sa.send(':CAL:AUTO OFF')
+        sa.send(':CALC:MARK1:MODE POS')
+        sa.send(f':SENS:FREQ:SPAN {sa_span}Hz')
+        sa.send(f'DISP:WIND:TRAC:Y:RLEV {sa_rlev}')
+        sa.send(f'DISP:WIND:TRAC:Y:PDIV {sa_scale_y}')
+
+        gen_lo.send(f':OUTP:MOD:STAT OFF')
+        gen_mod.send(f':OUTP:MOD:STAT OFF')
+        gen_mod.send(f':RAD:ARB OFF')
+
+        def read_loss(gen, pow_set, freq):
+            gen.send(f'SOUR:POW {pow_set}dbm')
+            gen.send(f'SOUR:FREQ {freq}Hz')
+            gen.send(f'OUTP:STAT ON')
+            self._settle(0.5)
+            pow_read = float(sa.query(':CALCulate:MARKer:Y?'))
+            gen.send(f'OUTP:STAT OFF')
+            return 10 if mock_enabled else abs(pow_set - pow_read)
+
+        def tune_sa(freq):
+            sa.send(f':SENSe:FREQuency:CENTer {freq}Hz')
+            sa.send(f':CALCulate:MARKer1:X {freq}Hz')
+            self._settle(0.5)
+
+        def measure_freqs(freqs):
+            result_lo = defaultdict(dict)
+            result_rf = dict()
+            # frequency outermost: the analyzer is retuned once per frequency for all LO powers
+            for freq_gen in freqs:
+                freq_sa = sa_freqs[freq_gen]
+                tune_sa(freq_gen)
+
+                for pow_lo in pow_lo_values:
+                    if token.cancelled:
+                        raise RuntimeError('calibration cancelled')
+
+                    result_lo[pow_lo][freq_gen] = read_loss(gen_lo, pow_lo, freq_gen)
+                    print('loss LO: ', result_lo[pow_lo][freq_gen])
+
+                # the RF path corrects the analyzer readings around the analyzer frequency,
+                # a passive path loss, one level is enough
+                if freq_sa != freq_gen:
+                    tune_sa(freq_sa)
+                result_rf[freq_sa] = read_loss(gen_mod, max(pow_lo_values), freq_sa)
+                print('loss RF: ', result_rf[freq_sa])
+            return result_lo, result_rf
+
+        def merge(stored, measured):
+            merged = {k: dict(v) for k, v in stored.items()}
+            for pow_lo, row in measured.items():
+                merged.setdefault(pow_lo, dict()).update(row)
+            return merged
+
+        freqs_gen = [freq * 2 if lo_f_is_div2 else freq for freq in freq_lo_values]
+        sa_freqs = dict(zip(freqs_gen, freq_lo_values))
+        gen_freqs = dict(zip(freq_lo_values, freqs_gen))
+
+        try:
+            idns = {k: self._instrument(k).query('*IDN?').strip() for k in ['P LO', 'P MOD', 'Анализатор']}
+            meta = calibration_meta(pow_lo_values, freqs_gen, idns, secondary)
+            issues = check_calibration(self._calibration_meta, meta, secondary['cal_max_age'])
+
+            if secondary['cal_incremental'] and not issues:
+                missing = missing_freqs(self._calibrated_pows_lo, self._calibrated_rf, pow_lo_values, freqs_gen,
+                                        freq_lo_values)
+                stored = [f for f in freqs_gen if f not in missing]
+
+                spots = spot_indices(len(stored), int(secondary['cal_spot_count']))
+                spot_lo, spot_rf = measure_freqs([stored[i] for i in spots])
+                drifted_spots = set(drifted(self._calibrated_pows_lo, spot_lo, secondary['cal_tolerance'])) | \
+                    {gen_freqs[f] for f in drifted_rf(self._calibrated_rf, spot_rf, secondary['cal_tolerance'])}
+                regions = drift_regions(stored, spots, drifted_spots)
+                print(f'spot check: {len(spots)} points, drifted {sorted(drifted_spots)}, '
+                      f're-measuring {len(regions)} drifted and {len(missing)} new points')
+
+                result_lo, result_rf = measure_freqs(sorted(set(regions) | set(missing)))
+
+                self._calibrated_pows_lo = merge(merge(self._calibrated_pows_lo, spot_lo), result_lo)
+                self._calibrated_rf = {**self._calibrated_rf, **spot_rf, **result_rf}
+
+                meta['created'] = self._calibration_meta['created']
+                meta['pow'] = sorted(set(self._calibration_meta['pow']) | set(meta['pow']))
+                meta['freq'] = sorted(set(self._calibration_meta['freq']) | set(meta['freq']))
+            else:
+                print('full calibration:', issues if secondary['cal_incremental'] else 'incremental mode off')
+                result_lo, result_rf = measure_freqs(freqs_gen)
+
+                self._calibrated_pows_lo = {k: v for k, v in result_lo.items()}
+                self._calibrated_rf = result_rf
+        except RuntimeError:
+            gen_lo.send(f'OUTP:STAT OFF')
+            gen_mod.send(f'OUTP:STAT OFF')
+            sa.send(':CAL:AUTO ON')
+            raise
+
+        gen_lo.send(f'SOUR:FREQ {lo_f_start}Hz')
+        gen_mod.send(f'SOUR:FREQ {lo_f_start}Hz')
+        sa.send(':CAL:AUTO ON')
+
+        self._calibration_meta = meta
+        self._save_calibration()
+
+        if secondary['cal_timing']:
+            self._characterize_timing(token, secondary, freq_lo_values)
         return True
 
+    def _characterize_timing(self, token, secondary, freqs_sa):
+        print('characterize settle times')
+        # the sweep looks the LO retune up at the generator frequency and the analyzer at its own,
+        # they differ by two with the LO divided
+        freqs_gen = [f * 2 if secondary['is_Flo_div2'] else f for f in freqs_sa]
+        gen_lo = self._instrument('P LO')
+        sa = self._instrument('Анализатор')
+
+        tolerance = secondary['timing_tolerance']
+        margin = secondary['timing_margin']
+        lo_pow = secondary['Plo_max']
+        sa_span = secondary['sa_span'] * MEGA
+
+        def read():
+            return float(sa.query(':CALCulate:MARKer:Y?'))
+
+        def characterize(transition, band, leave, enter):
+            # settled reading first, then time how fast a fresh transition gets within tolerance of it
+            limit = default_delays[transition] * 3
+            leave()
+            self._settle(default_delays[transition])
+            enter()
+            self._settle(limit)
+            target = read()
+
+            leave()
+            self._settle(default_delays[transition])
+            enter()
+            seconds = convergence_time(read, target, tolerance, limit)
+            self._timing.set(transition, band, seconds * margin)
+            print(f'band {band}, {transition}: {seconds:.3f} s')
+
+        def tune_sa(freq):
+            sa.send(f':SENSe:FREQuency:CENTer {freq}Hz')
+            sa.send(f':CALCulate:MARKer1:X {freq}Hz')
+
+        idns = {k: self._instrument(k).query('*IDN?').strip() for k in ['P LO', 'P MOD', 'Анализатор']}
+        self._timing = TimingProfile(timing_identity(idns, secondary))
+
+        sa.send(f'AVER:COUNT {secondary["sa_avg_count"]}')
+        sa.send(f'AVER {"ON" if secondary["sa_avg_state"] else "OFF"}')
+        gen_lo.send(f'SOUR:POW {lo_pow}dbm')
+
+        def in_band(freqs, band):
+            # the middle grid frequency of the band and the step the sweep makes to it from its neighbour
+            members = [f for f in freqs if band_of(f) == band]
+            freq = members[len(members) // 2]
+            i = freqs.index(freq)
+            return freq, freqs[i - 1] if i else freqs[min(1, len(freqs) - 1)]
+
+        gen_lo.send(f'OUTP:STAT ON')
+        try:
+            for band in sorted({band_of(f) for f in freqs_sa}):
+                if token.cancelled:
+                    raise RuntimeError('timing characterization cancelled')
+
+                # the generator is only the test signal here, at the frequency the analyzer looks at
+                freq, freq_prev = in_band(freqs_sa, band)
+                gen_lo.send(f'SOUR:FREQ {freq}Hz')
+
+                characterize('analyzer', band, lambda: tune_sa(freq_prev), lambda: tune_sa(freq))
+                characterize(
+                    'marker', band,
+                    lambda: sa.send(f':CALCulate:MARKer1:X {freq + sa_span / 4}Hz'),
+                    lambda: sa.send(f':CALCulate:MARKer1:X {freq}Hz')
+                )
+
+            for band in sorted({band_of(f) for f in freqs_gen}):
+                if token.cancelled:
+                    raise RuntimeError('timing characterization cancelled')
+
+                freq, freq_prev = in_band(freqs_gen, band)
+                tune_sa(freq)
+                characterize(
+                    'retune', band,
+                    lambda: gen_lo.send(f'SOUR:FREQ {freq_prev}Hz'),
+                    lambda: gen_lo.send(f'SOUR:FREQ {freq}Hz')
+                )
+        except RuntimeError:
+            gen_lo.send(f'OUTP:STAT OFF')
+            self._timing = TimingProfile.from_dict(load_ast_if_exists('timing.ini', default={}))
+            raise
+
+        gen_lo.send(f'OUTP:STAT OFF')
+        pprint_to_file('timing.ini', self._timing.to_dict())
+
+    def _save_calibration(self):
+        pprint_to_file('cal.ini', {
+            'meta': self._calibration_meta,
+            'lo': self._calibrated_pows_lo,
+            'rf': self._calibrated_rf,
+        })
+
     def measure(self, token, params):
         print(f'call measure with {token} {params}')
         device, _ = params
+        self._token = token
+        self._run_device = device
+        self._run_started = datetime.datetime.now().isoformat()
+        self._run_id = None
+        self._start_publisher()
         try:
+            golden_ref = self.secondaryParams['golden_ref']
+            self.result.golden = None
+            if golden_ref:
+                from goldenunit import GoldenReference
+                try:
+                    # the same adjustment as the live points, so it cancels out of the deltas
+                    adjustment = load_ast_if_exists(self.deviceParams[device]['adjust'], default={})
+                    self.result.golden = GoldenReference.from_file(
+                        golden_ref, self.secondaryParams['golden_tolerance'], adjustment)
+                except OSError as ex:
+                    print('golden reference not loaded:', ex)
             self.result.set_secondary_params(self.secondaryParams)
             self.result.set_primary_params(self.deviceParams[device])
+            from soakmonitor import SoakMonitor
+            self.result.soak = SoakMonitor(self.secondaryParams['soak_params']) \
+                if self.secondaryParams['soak'] and self.secondaryParams['soak_stream'] else None
+            self._publish('status', {'state': 'running', 'device': device})
+            self._clock = self._run_clock()
             self._measure(token, device)
             # self.hasResult = bool(self.result)
             self.hasResult = True  # HACK
+            self._store_result(device)
+            self._publish('status', {'state': 'finished', 'device': device, 'verdict': self.result.verdict})
         except RuntimeError as ex:
             print('runtime error:', ex)
+            if self._run_id is not None:
+                # a soak ends with cancel, the passes before are already stored, so is the one it was in
+                self._store_result(device)
+            self._publish('status', {'state': 'aborted', 'device': device, 'reason': str(ex)})
+        finally:
+            self._clock = None
+            if self.result.soak is not None:
+                self.result.soak.close()
 
     def _measure(self, token, device):
         param = self.deviceParams[device]
@@ -227,9 +590,99 @@ class InstrumentController(QObject):
         print(f'launch measure with {token} {param} {secondary}')
 
         self._clear()
-        self._measure_s_params(token, param, secondary)
+        if secondary['engine_process']:
+            return self._measure_in_engine(token, device)
+
+        # a soak records for hours, its trace is written out in parts
+        self._recorder = TraceRecorder(
+            header={'device': param, 'secondary': secondary},
+            max_entries=200000 if secondary['soak'] else None
+        ) if secondary['trace_record'] else NullRecorder()
+        self._replay = TraceReplay.latest(realtime=secondary['trace_replay_realtime']) \
+            if secondary['trace_replay'] else None
+        try:
+            self._measure_s_params(token, param, secondary)
+        finally:
+            self._recorder.close()
+            self._recorder = NullRecorder()
+            self._replay = None
         return True
 
+    def _measure_in_engine(self, token, device):
+        # the sweep runs in its own process, points come back through the shared memory ring
+        if self._engine is None or not self._engine.running:
+            # multiprocessing and shared memory are only imported when a run asks for the engine
+            from engineprocess import EngineClient
+            self._engine = EngineClient()
+            self._engine.start({k: v.addr for k, v in self.requiredInstruments.items()})
+
+        has_result, verdict = self._engine.measure(device, self.secondaryParams, token, self._add_measure_point)
+        self.result.verdict = verdict
+        # the engine learned the run costs, its duration.ini is newer than ours
+        self._durations = DurationModel.from_dict(load_ast_if_exists('duration.ini', default={}))
+        if not has_result:
+            raise RuntimeError('measurement in engine process failed or was cancelled')
+        return True
+
+    def close(self):
+        if self._engine is not None:
+            self._engine.stop()
+            self._engine = None
+        if self._publisher is not None:
+            self._publisher.stop()
+            self._publisher = None
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+    def analyze_lot(self, device, lot):
+        from lotstats import LotArray, lot_statistics
+        from resultstore import ResultStore
+        # runs off the GUI thread, possibly while a sweep stores its result, so it reads on its own connection
+        store = ResultStore()
+        try:
+            runs = store.find(device=device, lot=lot or None)
+            if not runs:
+                return None
+
+            print(f'lot {lot}: {len(runs)} runs of {device}')
+            lot_array = LotArray.from_store(store, [r['id'] for r in runs])
+            try:
+                return lot_statistics(lot_array, SpecLimits.from_table(self.deviceParams[device]['result']))
+            finally:
+                lot_array.close()
+        finally:
+            store.close()
+
+    def _store_result(self, device):
+        secondary = self.secondaryParams
+        if not secondary['store_results'] or not self.result.points:
+            return
+        from resultstore import ResultStore
+        if self._store is None:
+            self._store = ResultStore()
+        if self._run_id is not None:
+            self._store.add_pass(self._run_id, self.result.current_pass, self.result.points, self.result.raw_points,
+                                 verdict=self.result.verdict)
+            print(f'stored pass {self.result.current_pass} of run {self._run_id}')
+            return
+        meta = self._calibration_meta
+        self._run_id = self._store.add(
+            self.result.points,
+            self.result.raw_points,
+            device=device,
+            params=self.deviceParams[device],
+            secondary=secondary,
+            calibration={k: meta.get(k) for k in ['created', 'timestamp', 'idn']} if meta else None,
+            serial=secondary['dut_serial'] or None,
+            lot=secondary['dut_lot'] or None,
+            operator=secondary['operator'] or None,
+            temperature=secondary['temperature'],
+            verdict=self.result.verdict,
+            started=self._run_started,
+        )
+        print(f'stored run {self._run_id}')
+
     def _clear(self):
         self.result.clear()
 
@@ -244,21 +697,26 @@ class InstrumentController(QObject):
 
         def set_read_marker(freq):
             sa.send(f':CALCulate:MARKer1:X {freq}Hz')
-            if not mock_enabled:
-                time.sleep(0.01)
+            self._settle(timing.delay('marker', freq))
             return float(sa.query(':CALCulate:MARKer:Y?'))
 
-        gen_lo = self._instruments['P LO']
-        gen_mod = self._instruments['P MOD']
-        src = self._instruments['Источник']
-        mult = self._instruments['Мультиметр']
-        sa = self._instruments['Анализатор']
+        learn = secondary['estimate_learn'] and not mock_enabled and self._replay is None
+        if secondary['profile']:
+            self._profiler = SweepProfiler(live=secondary['profile_live'])
+        else:
+            # learning needs only the phase totals, not the per command profile
+            self._profiler = PhaseTimer() if learn else NullProfiler()
+        self._batch = ScpiBatcher(int(secondary['scpi_batch_limit']), secondary['scpi_batch_check']) \
+            if secondary['scpi_batch'] else NullBatcher()
+
+        gen_lo = self._instrument('P LO')
+        gen_mod = self._instrument('P MOD')
+        src = self._instrument('Источник')
+        mult = self._instrument('Мультиметр')
+        sa = self._instrument('Анализатор')
 
         lo_pow_start = secondary['Plo_min']
-        lo_pow_end = secondary['Plo_max']
-        lo_pow_step = secondary['Plo_delta']
         lo_f_start = secondary['Flo_min'] * GIGA
-        lo_f_end = secondary['Flo_max'] * GIGA
         lo_f_step = secondary['Flo_delta'] * GIGA
 
         lo_f_is_div2 = secondary['is_Flo_div2']
@@ -280,75 +738,251 @@ class InstrumentController(QObject):
 
         sa_avg_state = 'ON' if secondary['sa_avg_state'] else 'OFF'
         sa_avg_count = secondary['sa_avg_count']
-
-        pow_lo_values = [
-            round(x, 3)for x in
-            np.arange(start=lo_pow_start, stop=lo_pow_end + 0.002, step=lo_pow_step)
-        ] if lo_pow_start != lo_pow_end else [lo_pow_start]
-
-        freq_lo_values = [
-            round(x, 3) for x in
-            np.arange(start=lo_f_start, stop=lo_f_end + 0.0001, step=lo_f_step)
-        ]
-
-        waveform_filename = 'WFM1:SINE_TEST_WFM'
-
-        gen_lo.send(f':OUTP:MOD:STAT OFF')
-        gen_mod.send(f':OUTP:MOD:STAT OFF')
-
-        gen_f_mul = 2 if d else 1
-        gen_lo.send(f':FREQ:MULT {gen_f_mul}')
-        # gen_mod.send(f':FREQ:MULT {gen_f_mul}')
-
-        gen_mod.send(f':RAD:ARB OFF')
-        gen_mod.send(f':RAD:ARB:WAV "{waveform_filename}"')
-        gen_mod.send(f':RAD:ARB:BASE:FREQ:OFFS {mod_f + mod_f_offs_0}Hz')
-        gen_mod.send(f':RAD:ARB:RSC {mod_u}')
-        gen_mod.send(f':DM:IQAD:EXT:COFF {mod_u_offs}V')
-        gen_mod.send(f':DM:IQAD ON')
-        gen_mod.send(f':DM:STAT ON')
-        gen_mod.send(f':DM:IQAD:EXT:IQAT 0db')
-
-        src.send(f'APPLY p6v,{src_u}V,{src_i_max}A')
-        src.send(f'APPLY p25v,{src_u_d}V,{src_i_d_max}A')
-
-        sa.send(':CAL:AUTO OFF')
-        sa.send(f':SENS:FREQ:SPAN {sa_span}Hz')
-        sa.send(f'DISP:WIND:TRAC:Y:RLEV {sa_rlev}')
-        sa.send(f'DISP:WIND:TRAC:Y:PDIV {sa_scale_y}')
-        sa.send(':CALC:MARK1:MODE POS')
-        sa.send(f'AVER:COUNT {sa_avg_count}')
-        sa.send(f'AVER {sa_avg_state}')
+        sa_avg_adaptive = secondary['sa_avg_adaptive']
+        sa_avg_tol = secondary['sa_avg_tol']
+        sa_zero_span = secondary['sa_zero_span']
+
+        mod_tones = [f * MEGA for f in secondary['mod_tones']]
+        if mod_tones and sa_zero_span:
+            print('multi-tone modulation is read from one trace per point, zero span not used')
+            sa_zero_span = False
+
+        mult_buffered = secondary['mult_buffered']
+        mult_nplc = secondary['mult_nplc']
+        mult_samples = int(secondary['mult_samples'])
+
+        prod_mode = secondary['prod_mode']
+        soak = secondary['soak']
+
+        pow_lo_values, freq_lo_values = sweep_grid(secondary)
+
+        freqs_gen = [freq * 2 if lo_f_is_div2 else freq for freq in freq_lo_values]
+        cal_issues = check_calibration(
+            self._calibration_meta,
+            calibration_meta(pow_lo_values, freqs_gen, None, secondary),
+            secondary['cal_max_age']
+        )
+        cal_missing = missing_freqs(self._calibrated_pows_lo, self._calibrated_rf, pow_lo_values, freqs_gen,
+                                    freq_lo_values)
+        if cal_missing:
+            cal_issues.append(f'{len(cal_missing)} grid frequencies not calibrated')
+        if cal_issues:
+            print('calibration does not match the sweep:', cal_issues)
+
+        timing = TimingProfile()
+        if self._timing:
+            idns = {k: self._instrument(k).query('*IDN?').strip() for k in ['P LO', 'P MOD', 'Анализатор']}
+            if self._timing.matches(timing_identity(idns, secondary)):
+                timing = self._timing
+            else:
+                print('timing profile is for another bench or averaging, using default settle times')
+
+        waveform = None
+        if mod_tones:
+            waveform = MultiToneWaveform(mod_tones)
+            # every line of every tone on one trace, the farthest is the 3rd harmonic of the highest tone
+            sa_span = max(sa_span, 8 * max(mod_tones))
+            clashes = collisions(mod_tones, sa_span / 200)
+            if clashes:
+                print(f'modulation tones with overlapping lines, readings are not separable: {clashes}')
+            print(f'multi-tone waveform {waveform.name}: {len(mod_tones)} tones, {waveform.tone_level:.1f} dB per tone, '
+                  f'readings referred to a single tone')
+            if mock_enabled or self._replay is not None:
+                print('multi-tone waveform upload skipped in mock and replay mode')
+            else:
+                # straight to the generator, past the recorder: the upload depends on what the generator
+                # memory already holds, a trace replays the same commands either way
+                with self._profiler.phase('setup'):
+                    upload_if_missing(self._instruments['P MOD'], waveform)
+
+        with self._profiler.phase('setup'), self._batch.collect():
+            waveform_filename = f'WFM1:{waveform.name}' if waveform else 'WFM1:SINE_TEST_WFM'
+
+            gen_lo.send(f':OUTP:MOD:STAT OFF')
+            gen_mod.send(f':OUTP:MOD:STAT OFF')
+
+            gen_f_mul = 2 if d else 1
+            gen_lo.send(f':FREQ:MULT {gen_f_mul}')
+            # gen_mod.send(f':FREQ:MULT {gen_f_mul}')
+
+            gen_mod.send(f':RAD:ARB OFF')
+            gen_mod.send(f':RAD:ARB:WAV "{waveform_filename}"')
+            if waveform:
+                # the stored waveform is one tone at -mod_f_offs_0 that the base offset moves up to Fmod,
+                # synthesized tones are generated at their modulation frequencies, shifting them would
+                # put every tone mod_f_offs_0 off
+                gen_mod.send(f':RAD:ARB:SCL:RATE {waveform.sample_rate}Hz')
+                gen_mod.send(':RAD:ARB:BASE:FREQ:OFFS 0Hz')
+            else:
+                gen_mod.send(f':RAD:ARB:BASE:FREQ:OFFS {mod_f + mod_f_offs_0}Hz')
+            gen_mod.send(f':RAD:ARB:RSC {mod_u}')
+            gen_mod.send(f':DM:IQAD:EXT:COFF {mod_u_offs}V')
+            gen_mod.send(f':DM:IQAD ON')
+            gen_mod.send(f':DM:STAT ON')
+            gen_mod.send(f':DM:IQAD:EXT:IQAT 0db')
+
+            src.send(f'APPLY p6v,{src_u}V,{src_i_max}A')
+            src.send(f'APPLY p25v,{src_u_d}V,{src_i_d_max}A')
+
+            sa.send(':CAL:AUTO OFF')
+            sa.send(f':SENS:FREQ:SPAN {sa_span}Hz')
+            sa.send(f'DISP:WIND:TRAC:Y:RLEV {sa_rlev}')
+            sa.send(f'DISP:WIND:TRAC:Y:PDIV {sa_scale_y}')
+            sa.send(':CALC:MARK1:MODE POS')
+            if sa_zero_span:
+                zero_span = ZeroSpanReader(sa, mod_f)
+                zero_span.setup()
+                print(f'zero span: RBW {zero_span.rbw} Hz, sweep {zero_span.sweep_time} s')
+            elif sa_avg_adaptive:
+                # software averaging over single sweeps, the analyzer must not average on its own
+                sa.send('AVER OFF')
+                sa.send(':INIT:CONT OFF')
+            else:
+                sa.send(f'AVER:COUNT {sa_avg_count}')
+                sa.send(f'AVER {sa_avg_state}')
+
+            if mult_buffered:
+                # configure once, every point only arms a burst into the reading memory
+                mult.send('CONF:CURR:DC 1A')
+                mult.send('CURR:DC:RANG:AUTO OFF')
+                mult.send(f'CURR:DC:NPLC {mult_nplc}')
+                mult.send('TRIG:SOUR IMM')
+                mult.send('TRIG:COUN 1')
+                mult.send(f'SAMP:COUN {mult_samples}')
+
+        def shutdown():
+            gen_lo.send(f'OUTP:STAT OFF')
+            gen_mod.send(f'OUTP:STAT OFF')
+            gen_mod.send(f':RAD:ARB OFF')
+            self._settle(0.5, cancellable=False)
+            src.send('OUTPut OFF')
+
+            gen_lo.send(f'SOUR:POW {lo_pow_start}dbm')
+            gen_lo.send(f'SOUR:FREQ {lo_f_start}Hz')
+
+            if sa_zero_span:
+                zero_span.restore(sa_span)
+            elif sa_avg_adaptive:
+                sa.send(':INIT:CONT ON')
+            sa.send(':CAL:AUTO ON')
+
+            if mult_buffered:
+                mult.send('SAMP:COUN 1')
+                mult.send('CURR:DC:RANG:AUTO ON')
 
         if mock_enabled:
             with open('./mock_data/-10+0db_live3.txt', mode='rt', encoding='utf-8') as f:
-                index = 0
                 mocked_raw_data = ast.literal_eval(''.join(f.readlines()))
 
-        res = []
-        for lo_pow in pow_lo_values:
-
-            for lo_freq in freq_lo_values:
-
-                freq_sa = lo_freq
-                if lo_f_is_div2:
-                    lo_freq *= 2
-
-                if token.cancelled:
-                    gen_lo.send(f'OUTP:STAT OFF')
-                    gen_mod.send(f'OUTP:STAT OFF')
-                    gen_mod.send(f':RAD:ARB OFF')
-                    if not mock_enabled:
-                        time.sleep(0.5)
-                    src.send('OUTPut OFF')
-
-                    gen_lo.send(f'SOUR:POW {lo_pow_start}dbm')
-                    gen_lo.send(f'SOUR:FREQ {lo_f_start}Hz')
-
-                    sa.send(':CAL:AUTO ON')
-                    raise RuntimeError('measurement cancelled')
+        points = [(lo_pow, lo_freq) for lo_pow in pow_lo_values for lo_freq in freq_lo_values]
+        order = range(len(points))
+
+        # extra sweep axes wrap the LO grid, the costliest to switch outermost
+        sweep_axes = ordered_axes(secondary['sweep_axes'])
+        if waveform and sweep_axes.pop('Fmod', None):
+            print('Fmod axis ignored, the multi-tone waveform plays all modulation tones at once')
+        combos = [dict(zip(sweep_axes, values)) for values in itertools.product(*sweep_axes.values())]
+        apply_axis = {
+            'Fmod': lambda v: gen_mod.send(f':RAD:ARB:BASE:FREQ:OFFS {v * MEGA + mod_f_offs_0}Hz'),
+            'Umod': lambda v: gen_mod.send(f':RAD:ARB:RSC {v}'),
+            'Uoffs': lambda v: gen_mod.send(f':DM:IQAD:EXT:COFF {v * MILLI}V'),
+            'Usrc': lambda v: src.send(f'APPLY p6v,{v}V,{src_i_max}A'),
+            'UsrcD': lambda v: src.send(f'APPLY p25v,{v}V,{src_i_d_max}A'),
+        }
 
-                pow_loss = self._calibrated_pows_lo.get(lo_pow, dict()).get(lo_freq, 0) / 2
+        judge = None
+        if prod_mode:
+            limits = SpecLimits.from_table(param['result'])
+            if limits:
+                judge = ProductionJudge(limits, secondary['prod_sigma'], secondary['prod_confidence'])
+            else:
+                print(f'no spec limits in {param["result"]}, production verdict disabled')
+            if secondary['prod_screen_first']:
+                order = screening_order(points, limits, self._screening_reference)
+
+        spur_indices = set()
+        spur_table = None
+        if secondary['spur_search'] and mock_enabled and self._replay is None:
+            print('spur search needs real analyzer traces, skipped in mock mode')
+        elif secondary['spur_search']:
+            from spursearch import SpurTable, acquire_trace
+            spur_start = secondary['spur_start'] * GIGA
+            spur_stop = secondary['spur_stop'] * GIGA
+            spur_chunk = secondary['spur_chunk'] * MEGA
+            spur_sweep_points = int(secondary['spur_sweep_points'])
+            spur_rbw = secondary['spur_rbw'] * 1000
+            bin_width = spur_chunk / (spur_sweep_points - 1)
+
+            if secondary['spur_points']:
+                spur_indices = {
+                    i for i, (lo_pow, lo_freq) in enumerate(points)
+                    for p, f in secondary['spur_points'] if p == lo_pow and abs(lo_freq - f * GIGA) < lo_f_step / 2
+                }
+            else:
+                last = len(freq_lo_values) - 1
+                spur_indices = {points.index((pow_lo_values[-1], freq_lo_values[i])) for i in {0, last // 2, last}}
+
+            spur_table = SpurTable(
+                secondary['spur_threshold'],
+                tolerance=2 * max(bin_width, spur_rbw),
+                min_spacing=1.5 * bin_width
+            )
+            # peak search and classification run behind the sweep, only the acquisition needs the analyzer
+            spur_worker = SweepPipeline(spur_table.analyze)
+
+        def search_spurs(lo_pow, lo_freq, freq_sa, mod_f):
+            with self._profiler.phase('spurs'):
+                # the tone setup sweep points are put back after the search
+                sweep_points = int(float(sa.query(':SENS:SWE:POIN?')))
+                with self._batch.collect():
+                    sa.send(':INIT:CONT OFF')
+                    sa.send('DISP:WIND:TRAC:X:OFFS 0Hz')
+                    sa.send(f':SENS:BAND:RES {spur_rbw}Hz')
+                    sa.send(f':SENS:SWE:POIN {spur_sweep_points}')
+                    # zero span fixes the sweep time, the wide chunks need it coupled to the RBW again
+                    sa.send(':SENS:SWE:TIME:AUTO ON')
+
+                traces = list()
+                for start in np.arange(spur_start, spur_stop, spur_chunk):
+                    if token.cancelled:
+                        raise RuntimeError('measurement cancelled')
+                    traces.append(acquire_trace(sa, start, min(start + spur_chunk, spur_stop), spur_sweep_points))
+
+                # back to the tone measurement setup, the next point retunes the center
+                with self._batch.collect():
+                    sa.send(f':SENS:SWE:POIN {sweep_points}')
+                    if sa_zero_span:
+                        # span, RBW, sweep time and marker all sent again
+                        zero_span.reset()
+                    else:
+                        sa.send(':SENS:BAND:RES:AUTO ON')
+                        sa.send(f':SENS:FREQ:SPAN {sa_span}Hz')
+                        if not sa_avg_adaptive:
+                            sa.send(':INIT:CONT ON')
+            spur_worker.submit(lo_pow, lo_freq, freq_sa, mod_f, traces)
+
+        tone_cache = dict()
+
+        def tone_list(freq_sa, mod_f):
+            # output, carrier, sideband, 3rd harmonic
+            key = (freq_sa, mod_f)
+            if key not in tone_cache:
+                tone_cache[key] = tone_groups(freq_sa, [mod_f], lo_f_is_div2)[0]
+            return tone_cache[key]
+
+        def measure_point(index, combo):
+            lo_pow, lo_freq = points[index]
+            mod_f = combo.get('Fmod', secondary['Fmod']) * MEGA
+            src_u = combo.get('Usrc', secondary['Usrc'])
+
+            freq_sa = lo_freq
+            if lo_f_is_div2:
+                lo_freq *= 2
+
+            pow_loss = self._calibrated_pows_lo.get(lo_pow, dict()).get(lo_freq, 0) / 2
+            rf_loss = self._calibrated_rf.get(freq_sa, None)
+            rf_loss = pow_loss if rf_loss is None else rf_loss / 2
+            with self._profiler.phase('retune'), self._batch.collect():
                 gen_lo.send(f'SOUR:POW {lo_pow + pow_loss}dbm')
                 gen_lo.send(f'SOUR:FREQ {lo_freq}Hz')
 
@@ -359,102 +993,318 @@ class InstrumentController(QObject):
                 gen_mod.send(f'OUTP:STAT ON')
                 gen_mod.send(f':RAD:ARB ON')
 
-                # time.sleep(0.1)
-                if not mock_enabled:
-                    time.sleep(0.6)
-
-                sa.send(f'DISP:WIND:TRAC:X:OFFS {0}Hz')
-                center_f = freq_sa / 2 if d else freq_sa
-                sa.send(f':SENSe:FREQuency:CENTer {center_f}Hz')
-                offset = freq_sa / 2 if d else 0
-                sa.send(f'DISP:WIND:TRAC:X:OFFS {offset}Hz')
-
-                if not mock_enabled:
-                    time.sleep(1)
-
-                if lo_f_is_div2:
-                    f_out = freq_sa + mod_f
-                    sa_p_out = set_read_marker(f_out)
-
-                    f_carr = freq_sa
-                    sa_p_carr = set_read_marker(f_carr)
-
-                    f_sb = freq_sa - mod_f
-                    sa_p_sb = set_read_marker(f_sb)
-
-                    f_3_harm = freq_sa - 3 * mod_f
-                    sa_p_3_harm = set_read_marker(f_3_harm)
+            # time.sleep(0.1)
+            self._settle(timing.delay('retune', lo_freq))
+
+            if mult_buffered:
+                # the burst runs while the analyzer is read out
+                mult.send('INIT')
+
+            if waveform:
+                tones = [f for group in tone_groups(freq_sa, mod_tones, lo_f_is_div2) for f in group]
+            else:
+                tones = tone_list(freq_sa, mod_f)
+            offset = freq_sa / 2 if d else 0
+            if sa_zero_span:
+                # every tone read retunes the analyzer and waits for its own single sweep
+                def read_tones():
+                    return [zero_span.read(f - offset) for f in tones]
+            else:
+                with self._profiler.phase('analyzer'), self._batch.collect():
+                    sa.send(f'DISP:WIND:TRAC:X:OFFS {0}Hz')
+                    center_f = freq_sa / 2 if d else freq_sa
+                    sa.send(f':SENSe:FREQuency:CENTer {center_f}Hz')
+                    sa.send(f'DISP:WIND:TRAC:X:OFFS {offset}Hz')
+
+                self._settle(timing.delay('analyzer', freq_sa))
+
+                if waveform and not (mock_enabled and self._replay is None):
+                    # all tones from one acquisition, the displayed trace is centered on freq_sa
+                    def read_tones():
+                        levels = np.array(sa.query(':TRAC:DATA? TRACE1').split(','), dtype=np.float64)
+                        return trace_levels(freq_sa - sa_span / 2, freq_sa + sa_span / 2, levels, tones)
                 else:
-                    f_out = freq_sa - mod_f
-                    sa_p_out = set_read_marker(f_out)
-
-                    f_carr = freq_sa
-                    sa_p_carr = set_read_marker(f_carr)
-
-                    f_sb = freq_sa + mod_f
-                    sa_p_sb = set_read_marker(f_sb)
-
-                    f_3_harm = freq_sa + 3 * mod_f
-                    sa_p_3_harm = set_read_marker(f_3_harm)
+                    def read_tones():
+                        return [set_read_marker(f) for f in tones]
+
+            with self._profiler.phase('readout'):
+                if sa_avg_adaptive:
+                    avg = AdaptiveAverage(len(tones), tolerance=sa_avg_tol, cap=sa_avg_count)
+                    while not avg.done:
+                        if not sa_zero_span:
+                            sa.query(':INIT:IMM;*OPC?')
+                        avg.add(read_tones())
+                    readings = avg.means
+                    avg_count = avg.count
+                else:
+                    readings = read_tones()
+                    avg_count = 1 if sa_zero_span or not secondary['sa_avg_state'] else sa_avg_count
 
                 # lo_p_read = float(gen_lo.query('SOUR:POW?'))
                 # lo_f_read = float(gen_lo.query('SOUR:FREQ?'))
 
                 src_u_read = src_u
-                src_i_read = float(mult.query('MEAS:CURR:DC? 1A,DEF'))
-
+                if mult_buffered:
+                    src_i_samples = [float(v) for v in mult.query('FETC?').split(',')]
+                    src_i_read = sum(src_i_samples) / len(src_i_samples)
+                    src_i_read_min, src_i_read_max = min(src_i_samples), max(src_i_samples)
+                else:
+                    src_i_read = float(mult.query('MEAS:CURR:DC? 1A,DEF'))
+                    src_i_read_min = src_i_read_max = src_i_read
+
+            raw_point = {
+                'lo_p': lo_pow,
+                'lo_f': lo_freq,
+                'src_u': src_u_read,   # power source voltage as set in GUI
+                'src_i': src_i_read,
+                'src_i_min': src_i_read_min,
+                'src_i_max': src_i_read_max,
+                **dict(zip(tone_fields, readings)),
+                'loss': pow_loss,
+                'rf_loss': rf_loss,
+                'avg_count': avg_count,
+                'index': index,
+                **combo,
+            }
+
+            if index in spur_indices:
+                search_spurs(lo_pow, lo_freq, freq_sa, min(mod_tones) if waveform else mod_f)
+
+            if mock_enabled and self._replay is None:
+                # a fresh dict, the mocked points are reused for every axes point and soak pass
                 raw_point = {
-                    'lo_p': lo_pow,
-                    'lo_f': lo_freq,
-                    'src_u': src_u_read,   # power source voltage as set in GUI
-                    'src_i': src_i_read,
-                    'sa_p_out': sa_p_out,
-                    'sa_p_carr': sa_p_carr,
-                    'sa_p_sb': sa_p_sb,
-                    'sa_p_3_harm': sa_p_3_harm,
+                    **mocked_raw_data[index],
                     'loss': pow_loss,
+                    'rf_loss': rf_loss,
+                    'lo_f': lo_freq,
+                    'avg_count': avg_count,
+                    'index': index,
+                    **combo,
                 }
+            if not waveform:
+                return [raw_point]
+
+            # one point per modulation tone, Fmod becomes their sweep axis
+            if mock_enabled and self._replay is None:
+                readings = [raw_point[f] for f in tone_fields] * len(mod_tones)
+            return [
+                {
+                    **raw_point,
+                    **dict(zip(tone_fields, readings[4 * i:4 * i + 4])),
+                    'Fmod': f / MEGA,
+                    'tone_level': waveform.tone_level,
+                }
+                for i, f in enumerate(mod_tones)
+            ]
 
-                if mock_enabled:
-                    raw_point = mocked_raw_data[index]
-                    raw_point['loss'] = pow_loss
-                    raw_point['lo_f'] = lo_freq
-                    index += 1
-
-                print(raw_point)
-                self._add_measure_point(raw_point)
-                res.append(raw_point)
-
-        gen_lo.send(f'OUTP:STAT OFF')
-        gen_mod.send(f'OUTP:STAT OFF')
-        gen_mod.send(f':RAD:ARB OFF')
-        if not mock_enabled:
-            time.sleep(0.5)
-        src.send('OUTPut OFF')
-
-        gen_lo.send(f'SOUR:POW {lo_pow_start}dbm')
-        gen_lo.send(f'SOUR:FREQ {lo_f_start}Hz')
-
-        sa.send(':CAL:AUTO ON')
-
-        if not mock_enabled:
-            with open('out.txt', mode='wt', encoding='utf-8') as f:
-                f.write(str(res))
-
+        res = []
+        soak_started = datetime.datetime.now().isoformat().replace(':', '.')
+
+        def write_raw(points):
+            if mock_enabled or soak and not points:
+                return
+            if not soak:
+                file_name = 'out.txt'
+            else:
+                # one raw dump per pass, holding every pass of a long soak in memory is what soak mode avoids
+                if not os.path.isdir('soak'):
+                    os.makedirs('soak')
+                file_name = f'./soak/out-{soak_started}-pass{points[0]["pass"]:04}.txt'
+            with open(file_name, mode='wt', encoding='utf-8') as f:
+                f.write(str(points))
+
+        def process_point(index, raw_point):
+            print(raw_point)
+            self._add_measure_point(raw_point)
+            if soak and res and res[-1]['pass'] != raw_point['pass']:
+                write_raw(res)
+                res.clear()
+            res.append(raw_point)
+
+            if prod_mode:
+                report = self.result.last_report
+                self._screening_reference[points[index]] = report
+                reason = judge.judge(report) if judge is not None else None
+                if reason:
+                    print('production abort:', reason)
+                    self.result.verdict = judge.verdict
+                    return True
+            return False
+
+        if secondary['pipelined']:
+            pipeline = SweepPipeline(process_point)
+        else:
+            pipeline = InlinePipeline(process_point, self._profiler)
+
+        applied = dict()
+        soak_pass = 0
+        soak_until = time.monotonic() + secondary['soak_hours'] * 3600
+        try:
+            # soak mode repeats the whole sweep until the time is up or it is cancelled
+            while True:
+                for combo in combos:
+                    changed = {k: v for k, v in combo.items() if applied.get(k) != v}
+                    with self._profiler.phase('axis'), self._batch.collect():
+                        for k, v in changed.items():
+                            apply_axis[k](v)
+                    applied.update(changed)
+                    if changed and applied != changed:
+                        self._settle(0.6)
+
+                    for index in order:
+                        if token.cancelled:
+                            raise RuntimeError('measurement cancelled')
+
+                        for raw_point in measure_point(index, combo):
+                            if soak:
+                                raw_point['pass'] = soak_pass
+                            pipeline.submit(index, raw_point)
+                        self._profiler.point_done()
+
+                        if pipeline.stopped:
+                            break
+                    if pipeline.stopped:
+                        break
+                soak_pass += 1
+                if not soak or pipeline.stopped or (secondary['soak_hours'] and time.monotonic() > soak_until):
+                    break
+        except RuntimeError:
+            # cancel or instrument failure, leave the bench safe before reporting
+            shutdown()
+            pipeline.close()
+            if spur_table is not None:
+                spur_worker.close()
+                spur_table.close()
+            if soak:
+                # a soak usually ends with cancel, keep the pass it was in
+                write_raw(res)
+            raise
+
+        pipeline.close()
+        if spur_table is not None:
+            spur_worker.close()
+            spur_table.close()
+            spur_worker.check()
+
+        if judge is not None and not self.result.verdict:
+            self.result.verdict = judge.finish()
+
+        shutdown()
+        pipeline.check()
+
+        write_raw(res)
+
+        if secondary['profile']:
+            self._profiler.dump()
+        if learn and not soak and not pipeline.stopped:
+            self._learn_durations(secondary, res, len(combos), len(spur_indices) * len(combos))
         return res
 
+    def _instrument(self, name):
+        instrument = self._replay.instrument(name) if self._replay is not None else self._instruments[name]
+        return self._batch.wrap(name, self._profiler.wrap(name, self._recorder.wrap(name, instrument)))
+
+    def _settle(self, seconds, cancellable=True):
+        # the wait only means something once the batched writes are out
+        self._batch.flush()
+        # replayed traces reproduce the recorded waits themselves
+        if mock_enabled or self._replay is not None:
+            seconds = 0
+        with self._profiler.phase('settle'):
+            if cancellable and self._token is not None:
+                if _wait_cancelled(self._token, seconds):
+                    raise RuntimeError('cancelled')
+            elif seconds:
+                time.sleep(seconds)
+
     def _add_measure_point(self, data):
         print('measured point:', data)
+        if data.get('pass', 0) != self.result.current_pass:
+            # the result only holds the current soak pass, store the finished one before it is dropped
+            self._store_result(self._run_device)
         self.result.add_point(data)
         self.pointReady.emit()
+        if self._clock is not None:
+            self.estimateChanged.emit(self._clock.point_done())
+        self._publish('point', self.result.last_report)
+
+    def _start_publisher(self):
+        if not self.secondaryParams['live_stream']:
+            if self._publisher is not None:
+                self._publisher.stop()
+                self._publisher = None
+            return
+        if self._publisher is None:
+            from livestream import LivePublisher
+            self._publisher = LivePublisher(port=int(self.secondaryParams['live_port']))
+            try:
+                self._publisher.start()
+            except OSError as ex:
+                print('live stream not started:', ex)
+                self._publisher = None
+
+    def _publish(self, kind, payload):
+        if self._publisher is not None:
+            self._publisher.publish(kind, payload)
 
     def saveConfigs(self):
+        # never overwrite params.ini with defaults if the window is closed before configs were read
+        if not self._configs_loaded:
+            return
         pprint_to_file('params.ini', self.secondaryParams)
 
     @pyqtSlot(dict)
     def on_secondary_changed(self, params):
-        self.secondaryParams = params
+        self.secondaryParams.update(params)
+        if self._clock is None:
+            self._emit_estimate()
+
+    def _estimate(self):
+        return self._durations.estimate(self.secondaryParams, self._timing)
+
+    def _emit_estimate(self):
+        try:
+            self.estimateChanged.emit(str(self._estimate()))
+        except (ZeroDivisionError, ValueError):
+            # a zero step while the value is being typed in
+            self.estimateChanged.emit('')
+
+    def _run_clock(self):
+        try:
+            return RunClock(self._estimate())
+        except (ZeroDivisionError, ValueError):
+            return None
+
+    def _learn_durations(self, secondary, res, combos, spur_points):
+        phases = self._profiler.phase_totals()
+        adaptive = secondary['sa_avg_adaptive']
+        # a multi-tone point is one raw point per modulation tone
+        tones = len(secondary['mod_tones']) or 1
+        res = res[::tones]
+        sweeps = sum(p['avg_count'] for p in res) if adaptive else len(res)
+        spur_span = (secondary['spur_stop'] - secondary['spur_start']) * 1000
+        self._durations.learn(
+            phases,
+            points=len(res),
+            sweeps=sweeps,
+            combos=combos,
+            spur_traces=spur_points * int(np.ceil(spur_span / secondary['spur_chunk'])),
+            zero_span=secondary['sa_zero_span'] and not secondary['mod_tones'],
+            avg_fill=sweeps / len(res) / secondary['sa_avg_count'] if adaptive and res else None,
+        )
+        pprint_to_file('duration.ini', self._durations.to_dict())
 
     @property
     def status(self):
         return [i.status for i in self._instruments.values()]
+
+
+def _wait_cancelled(token, seconds):
+    # event based tokens wake up the moment cancel is pressed, plain ones are polled
+    try:
+        return token.wait(seconds)
+    except AttributeError:
+        deadline = time.perf_counter() + seconds
+        while not token.cancelled and time.perf_counter() < deadline:
+            time.sleep(min(0.005, max(0.0, deadline - time.perf_counter())))
+        return token.cancelled
@@ -0,0 +1,128 @@
+import json
+import queue
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class LivePublisher:
+    """Server-sent events feed of measured points and run status on localhost.
+
+    GET /events streams `point` and `status` events, GET /status returns the last status.
+    publish() never blocks: updates are dropped when the dispatcher falls behind, and
+    every subscriber has its own bounded queue so a slow client only loses its own updates.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8765, queue_size=256, client_queue_size=64):
+        self._address = (host, port)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._client_queue_size = client_queue_size
+
+        self._clients = set()
+        self._lock = threading.Lock()
+        self._status = {}
+        self.dropped = 0
+
+        self._server = None
+
+    @property
+    def running(self):
+        return self._server is not None
+
+    def start(self):
+        if self._server is not None:
+            return
+        self._server = ThreadingHTTPServer(self._address, _make_handler(self))
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        threading.Thread(target=self._dispatch, daemon=True).start()
+        print(f'live results at http://{self._address[0]}:{self._address[1]}/events')
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        self._queue.put(None)
+
+    def publish(self, kind, payload):
+        try:
+            self._queue.put_nowait((kind, payload))
+        except queue.Full:
+            self.dropped += 1
+
+    def _dispatch(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            kind, payload = item
+            message = f'event: {kind}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n'.encode('utf-8')
+            with self._lock:
+                if kind == 'status':
+                    self._status = payload
+                clients = list(self._clients)
+            for client in clients:
+                try:
+                    client.put_nowait(message)
+                except queue.Full:
+                    pass
+
+    def _subscribe(self):
+        client = queue.Queue(maxsize=self._client_queue_size)
+        with self._lock:
+            self._clients.add(client)
+            status = self._status
+        client.put_nowait(f'event: status\ndata: {json.dumps(status, ensure_ascii=False)}\n\n'.encode('utf-8'))
+        return client
+
+    def _unsubscribe(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+    @property
+    def status(self):
+        with self._lock:
+            return dict(self._status)
+
+
+def _make_handler(publisher):
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/status':
+                body = json.dumps(publisher.status, ensure_ascii=False).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            elif self.path == '/events':
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                self._stream()
+            else:
+                self.send_error(404)
+
+        def _stream(self):
+            client = publisher._subscribe()
+            try:
+                while publisher.running:
+                    try:
+                        message = client.get(timeout=15)
+                    except queue.Empty:
+                        message = b': keepalive\n\n'
+                    self.wfile.write(message)
+                    self.wfile.flush()
+            except OSError:
+                pass
+            finally:
+                publisher._unsubscribe(client)
+
+        def log_message(self, *args):
+            pass
+
+    return _Handler
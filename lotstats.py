@@ -0,0 +1,152 @@
+import os
+import tempfile
+import warnings
+
+import numpy as np
+
+from resultcube import axis_switch_cost
+
+
+lot_params = ['kp_out', 'ap_carr', 'a_sb', 'a_3h']
+
+
+def _combo_keys(columns, axes):
+    # sweep axes values of every point, None for an axis the run did not sweep
+    count = len(columns['lo_p'])
+    values = [
+        [None if np.isnan(v) else float(v) for v in columns[axis]] if axis in columns else [None] * count
+        for axis in axes
+    ]
+    return list(zip(*values)) if axes else [()] * count
+
+
+class LotArray:
+    """Runs of a lot aligned on one runs x axes point x power x frequency x parameter float array.
+
+    Points are placed by their sweep axes values as well as the LO grid, so the same grid point
+    measured at another supply or modulation setting is its own cell.
+
+    The array is a disk-backed memmap filled one run at a time, so a lot of any size only
+    ever has a single run and the current statistics slab in memory.
+    """
+
+    def __init__(self, run_ids, powers, freqs, params=None, path=None, axes=None, combos=None):
+        self.run_ids = list(run_ids)
+        self.axes = list(axes or [])
+        self.combos = list(combos or [()])
+        self.powers = list(powers)
+        self.freqs = list(freqs)
+        self.params = list(params or lot_params)
+        self._combo_index = {c: i for i, c in enumerate(self.combos)}
+
+        self._temporary = path is None
+        if self._temporary:
+            fd, path = tempfile.mkstemp(prefix='lot-', suffix='.dat')
+            os.close(fd)
+        self.path = path
+        shape = (len(self.run_ids), len(self.combos), len(self.powers), len(self.freqs), len(self.params))
+        self.data = np.memmap(path, dtype=np.float64, mode='w+', shape=shape)
+        self.data[:] = np.nan
+
+    @classmethod
+    def from_store(cls, store, run_ids, params=None, path=None):
+        run_ids = list(run_ids)
+        # first pass only collects the grid, so runs with different grids still line up
+        powers, freqs, run_combos = set(), set(), list()
+        for run_id in run_ids:
+            columns = store.load(run_id)
+            powers.update(columns['lo_p'].tolist())
+            freqs.update(columns['lo_f'].tolist())
+            run_axes = [k for k in columns if k in axis_switch_cost]
+            run_combos.extend(dict(zip(run_axes, key)) for key in set(_combo_keys(columns, run_axes)))
+
+        axes = sorted({k for combo in run_combos for k in combo}, key=lambda k: -axis_switch_cost[k])
+        combos = {tuple(combo.get(axis) for axis in axes) for combo in run_combos}
+        # runs that did not sweep an axis sort first
+        combos = sorted(combos, key=lambda c: [(v is not None, v or 0.0) for v in c])
+
+        lot = cls(run_ids, sorted(powers), sorted(freqs), params, path, axes, combos)
+        for i, run_id in enumerate(run_ids):
+            lot.set_run(i, store.load(run_id))
+        lot.data.flush()
+        return lot
+
+    def set_run(self, i, columns):
+        c = np.array([self._combo_index[key] for key in _combo_keys(columns, self.axes)], dtype=np.intp)
+        p = np.searchsorted(self.powers, columns['lo_p'])
+        f = np.searchsorted(self.freqs, columns['lo_f'])
+        for k, param in enumerate(self.params):
+            if param in columns:
+                self.data[i, c, p, f, k] = columns[param]
+
+    def close(self):
+        self.data = None
+        if self._temporary:
+            os.remove(self.path)
+            self._temporary = False
+
+
+class LotStats:
+    def __init__(self, runs, powers, freqs, params, percentiles, axes=None, combos=None):
+        self.axes = list(axes or [])
+        self.combos = list(combos or [()])
+        shape = (len(self.combos), len(powers), len(freqs), len(params))
+        self.runs = runs
+        self.powers = powers
+        self.freqs = freqs
+        self.params = params
+        self.percentile_levels = list(percentiles)
+        self.count = np.zeros(shape)
+        self.mean = np.full(shape, np.nan)
+        self.sigma = np.full(shape, np.nan)
+        self.percentiles = np.full((len(self.percentile_levels), ) + shape, np.nan)
+        self.cpk = np.full(shape, np.nan)
+
+    def combo(self, coords):
+        """Index of the axes point with the given `{axis: value}`, the first one if it is not in the lot."""
+        key = tuple(coords.get(axis) if coords else None for axis in self.axes)
+        return self.combos.index(key) if key in self.combos else 0
+
+    def param(self, name, combo=0):
+        """Per power/frequency stats of one parameter at one sweep axes point."""
+        k = self.params.index(name)
+        return {
+            'mean': self.mean[combo, ..., k],
+            'sigma': self.sigma[combo, ..., k],
+            'cpk': self.cpk[combo, ..., k],
+            **{f'p{level:g}': self.percentiles[i, combo, ..., k] for i, level in enumerate(self.percentile_levels)},
+        }
+
+    def worst_cpk(self):
+        return {p: float(np.nanmin(self.cpk[..., k])) if np.isfinite(self.cpk[..., k]).any() else None
+                for k, p in enumerate(self.params)}
+
+
+def lot_statistics(lot, limits=None, percentiles=(5, 50, 95), chunk=16):
+    """Mean, sigma, percentiles and Cpk over the runs axis, computed over `chunk` frequencies at a time."""
+    stats = LotStats(len(lot.run_ids), lot.powers, lot.freqs, lot.params, percentiles, lot.axes, lot.combos)
+
+    bounds = [limits.get(p, (np.nan, np.nan)) if limits else (np.nan, np.nan) for p in lot.params]
+    lower, upper = np.array(bounds, dtype=np.float64).T
+
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        # cells no run has measured stay NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for start in range(0, len(lot.freqs), chunk):
+            slab = np.asarray(lot.data[:, :, :, start:start + chunk, :])
+            window = slice(start, start + slab.shape[3])
+
+            count = np.sum(~np.isnan(slab), axis=0)
+            stats.count[:, :, window] = count
+            if not count.any():
+                continue
+            mean = np.nanmean(slab, axis=0)
+            sigma = np.nanstd(slab, axis=0, ddof=1)
+            stats.mean[:, :, window] = mean
+            stats.sigma[:, :, window] = sigma
+            stats.percentiles[:, :, :, window] = np.nanpercentile(slab, percentiles, axis=0)
+
+            # one-sided Cpk where only one limit is set, the smaller side where both are
+            cpk = np.fmin((upper - mean) / (3 * sigma), (mean - lower) / (3 * sigma))
+            stats.cpk[:, :, window] = cpk
+    return stats
@@ -1,20 +1,28 @@
 import datetime
 import os
-import time
+import threading
 
 from subprocess import Popen
 
 from PyQt5 import uic
 from PyQt5.QtGui import QGuiApplication
 from PyQt5.QtWidgets import QMainWindow
-from PyQt5.QtCore import Qt, pyqtSignal, pyqtSlot
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal, pyqtSlot
 
 from formlayout.formlayout import fedit
 from instrumentcontroller import InstrumentController
 from measurewidgetwithsecondaryparams import MeasureWidgetWithSecondaryParameters
 from mytools.connectionwidget import ConnectionWidget
+from pointtablewidget import PointTableWidget
 from primaryplotwidget import PrimaryPlotWidget
 from resulttablewidget import ResultTableWidget
+from soakplotwidget import SoakPlotWidget
+
+try:
+    # built from mainwindow.ui by install.py, saves parsing the XML on every start
+    from ui_mainwindow import Ui_MainWindow
+except ImportError:
+    Ui_MainWindow = None
 
 
 class MainWindow(QMainWindow):
@@ -22,6 +30,7 @@ class MainWindow(QMainWindow):
     instrumentsFound = pyqtSignal()
     sampleFound = pyqtSignal()
     measurementFinished = pyqtSignal()
+    lotAnalyzed = pyqtSignal(str, str, object)
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -30,7 +39,11 @@ class MainWindow(QMainWindow):
         self.setAttribute(Qt.WA_DeleteOnClose)
 
         # create instance variables
-        self._ui = uic.loadUi('mainwindow.ui', self)
+        if Ui_MainWindow is not None:
+            self._ui = Ui_MainWindow()
+            self._ui.setupUi(self)
+        else:
+            self._ui = uic.loadUi('mainwindow.ui', self)
         self.setWindowTitle('Измерение параметров КМ')
 
         self._instrumentController = InstrumentController(parent=self)
@@ -38,6 +51,8 @@ class MainWindow(QMainWindow):
         self._measureWidget = MeasureWidgetWithSecondaryParameters(parent=self, controller=self._instrumentController)
         self._plotWidget = PrimaryPlotWidget(parent=self, controller=self._instrumentController)
         self._tableResultWidget = ResultTableWidget(parent=self, controller=self._instrumentController)
+        self._soakPlotWidget = SoakPlotWidget(parent=self, controller=self._instrumentController)
+        self._pointTableWidget = PointTableWidget(parent=self, controller=self._instrumentController)
 
         # init UI
         self._ui.layInstrs.insertWidget(0, self._connectionWidget)
@@ -45,6 +60,8 @@ class MainWindow(QMainWindow):
 
         self._ui.tabWidget.insertTab(0, self._tableResultWidget, 'Результат измерения')
         self._ui.tabWidget.insertTab(0, self._plotWidget, 'Прогресс измерения')
+        self._ui.tabWidget.insertTab(2, self._pointTableWidget, 'Точки')
+        self._ui.tabWidget.insertTab(3, self._soakPlotWidget, 'Мониторинг')
         self._ui.tabWidget.setCurrentIndex(0)
 
         self._init()
@@ -59,8 +76,15 @@ class MainWindow(QMainWindow):
         self._measureWidget.measureComplete.connect(self.on_measureComplete)
 
         self._instrumentController.pointReady.connect(self.on_point_ready)
+        self._instrumentController.configsLoaded.connect(self.on_configs_loaded)
+        self._instrumentController.estimateChanged.connect(self.statusBar().showMessage)
+        self.lotAnalyzed.connect(self.on_lot_analyzed)
 
-        self._measureWidget.updateWidgets(self._instrumentController.secondaryParams)
+        # read configs off the GUI thread once the event loop is running and the window is shown
+        QTimer.singleShot(0, self._loadConfigs)
+
+    def _loadConfigs(self):
+        threading.Thread(target=self._instrumentController.emit_configs, daemon=True).start()
 
     def _saveScreenshot(self):
         screen = QGuiApplication.primaryScreen()
@@ -80,6 +104,11 @@ class MainWindow(QMainWindow):
         full_path = os.path.abspath(file_name)
         Popen(f'explorer /select,"{full_path}"')
 
+    @pyqtSlot(dict)
+    def on_configs_loaded(self, configs):
+        self._instrumentController.apply_configs(configs)
+        self._measureWidget.updateWidgets(self._instrumentController.secondaryParams)
+
     @pyqtSlot()
     def on_instrumens_connected(self):
         print(f'connected {self._instrumentController}')
@@ -88,13 +117,18 @@ class MainWindow(QMainWindow):
     def on_measureComplete(self):
         print('meas complete')
         self._instrumentController.result.process()
+        if self._instrumentController.result.last_report:
+            self._ui.pteditProgress.setPlainText(self._instrumentController.result.report)
+        self._plotWidget.updateAxes()
         self._plotWidget.plot()
         self._instrumentController.result.save_adjustment_template()
         self._tableResultWidget.updateResult()
+        self._pointTableWidget.updateResult()
 
     @pyqtSlot()
     def on_measureStarted(self):
         self._plotWidget.clear()
+        self._soakPlotWidget.clear()
 
     @pyqtSlot()
     def on_actParams_triggered(self):
@@ -118,16 +152,58 @@ class MainWindow(QMainWindow):
         self._instrumentController.result.only_main_states = only_main_states
         self._plotWidget.only_main_states = only_main_states
 
+    @pyqtSlot()
+    def on_actLotStats_triggered(self):
+        devices = list(self._instrumentController.deviceParams)
+        values = fedit(data=[('Партия', ''), ('Профиль', [0] + devices)], title='Статистика партии')
+        if not values:
+            return
+
+        lot, device_index = values
+        device = devices[device_index]
+        # a big store takes a while to read, the result comes back through lotAnalyzed
+        self._ui.actLotStats.setEnabled(False)
+        self._ui.pteditProgress.setPlainText(f'Статистика партии {lot}...')
+        threading.Thread(target=self._analyzeLot, args=(device, lot), daemon=True).start()
+
+    def _analyzeLot(self, device, lot):
+        try:
+            stats = self._instrumentController.analyze_lot(device, lot)
+        except Exception as ex:
+            print('lot statistics failed:', ex)
+            stats = None
+        self.lotAnalyzed.emit(device, lot, stats)
+
+    @pyqtSlot(str, str, object)
+    def on_lot_analyzed(self, device, lot, stats):
+        self._ui.actLotStats.setEnabled(True)
+        if stats is None:
+            self._ui.pteditProgress.setPlainText(f'Нет сохранённых измерений партии {lot}')
+            return
+
+        combos = f', {len(stats.combos)} комб. развёртки' if stats.axes else ''
+        self._ui.pteditProgress.setPlainText(
+            f'Партия {lot}, {device}: {stats.runs} изм., {len(stats.powers)} x {len(stats.freqs)} точек{combos}\n' +
+            ''.join(f'Cpk мин. {p}={v:0.2f}\n' for p, v in stats.worst_cpk().items() if v is not None)
+        )
+        # the envelope of the sweep axes point the plots show
+        self._plotWidget.plot_envelope(stats, combo=stats.combo(self._instrumentController.result.selection))
+
     @pyqtSlot()
     def on_point_ready(self):
         self._ui.pteditProgress.setPlainText(self._instrumentController.result.report)
         self._plotWidget.plot()
-
-    def closeEvent(self, _):
+        self._soakPlotWidget.plot()
+
+    def closeEvent(self, event):
+        if self._measureWidget._threads.activeThreadCount() > 0:
+            # the worker puts the bench into safe state on cancel, try closing again once it is gone
+            self._measureWidget.cancel()
+            event.ignore()
+            QTimer.singleShot(10, self.close)
+            return
         self._instrumentController.saveConfigs()
-        self._measureWidget.cancel()
-        while self._measureWidget._threads.activeThreadCount() > 0:
-            time.sleep(0.1)
+        self._instrumentController.close()
 
     @pyqtSlot()
     def on_btnExcel_clicked(self):
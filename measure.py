@@ -1,13 +1,29 @@
+import time
+
+# taken before the heavy imports below so the startup log covers them
+started = time.perf_counter()
+
+import datetime
 import sys
 
+from PyQt5.QtCore import QTimer
 from PyQt5.QtWidgets import QApplication
 from mainwindow import MainWindow
 
 
+def _log_startup_time():
+    elapsed = time.perf_counter() - started
+    print(f'startup took {elapsed:.3f}s')
+    with open('startup.log', mode='at', encoding='utf-8') as f:
+        f.write(f'{datetime.datetime.now().isoformat()} {elapsed:.3f}\n')
+
+
 def main(args):
     app = QApplication(args)
     window = MainWindow()
     window.show()
+    # fires on the first event loop pass, when the window is actually on screen
+    QTimer.singleShot(0, _log_startup_time)
     sys.exit(app.exec_())
 
 
@@ -1,16 +1,41 @@
 import os
 import datetime
-import openpyxl
 import random
 
 from collections import defaultdict
 from subprocess import Popen
 from textwrap import dedent
 
-import pandas as pd
+import numpy as np
 
 from forgot_again.file import load_ast_if_exists, pprint_to_file
 from instr.const import *
+from resultcube import ResultCube, axis_switch_cost
+
+
+column_labels = {
+    'lo_p': 'Pгет, дБм',
+    'lo_f': 'Fгет, ГГц',
+    'lo_p_loss': 'Pпот, дБ',
+    'kp_out': 'Кп, дБ',
+    'p_out': 'Pвых, дБм',
+    'p_carr': 'Pнес, дБм',
+    'p_sb': 'Pбок, дБм',
+    'p_3_harm': 'P3г, дБм',
+    'ap_carr': 'αп.нес, дБ',
+    'a_sb': 'αбок, дБ',
+    'a_3h': 'αx3, дБ',
+    'src_u': 'Uпит, В',
+    'src_i': 'Iпит, мА',
+    'src_i_min': 'Iпит.мин, мА',
+    'src_i_max': 'Iпит.макс, мА',
+    'avg_count': 'Nср',
+    'Fmod': 'Fмод, МГц',
+    'Umod': 'Uмод, %',
+    'Uoffs': 'Uсм, мВ',
+    'Usrc': 'Uпит.A, В',
+    'UsrcD': 'Uпит.D, В',
+}
 
 
 class MeasureResult:
@@ -21,6 +46,23 @@ class MeasureResult:
         self._report = dict()
         self._processed = list()
         self.ready = False
+        self.verdict = None
+
+        # extra sweep axes and the point of them the plots show, None follows the sweep
+        self._sweep_axes = list()
+        self._selection = None
+        self._cube = None
+        self._columns = None
+
+        # golden unit comparison, checked point by point as the sweep goes
+        self.golden = None
+        self.golden_failures = list()
+        # (lo_p, lo_f): out of tolerance, the verdict is kept up as points come in
+        self._golden_checked = dict()
+
+        # soak mode keeps only the current pass here, history goes to the monitor
+        self.soak = None
+        self._pass = 0
 
         self.data1 = defaultdict(list)
         self.data2 = defaultdict(list)
@@ -44,12 +86,19 @@ class MeasureResult:
 
         src_u = data['src_u']
         src_i = data['src_i'] / MILLI
+        src_i_min = data.get('src_i_min', data['src_i']) / MILLI
+        src_i_max = data.get('src_i_max', data['src_i']) / MILLI
 
         pow_loss = data['loss']
-        sa_p_out = data['sa_p_out'] + pow_loss
-        sa_p_carr = data['sa_p_carr'] + pow_loss
-        sa_p_sb = data['sa_p_sb'] + pow_loss
-        sa_p_3_harm = data['sa_p_3_harm'] + pow_loss
+        # analyzer readings are corrected by the RF path calibration when there is one, LO path otherwise
+        sa_loss = data.get('rf_loss', pow_loss)
+        # a multi-tone waveform plays every tone below a single full scale tone, the lines the
+        # modulation makes are referred back to it, the carrier leak comes from the LO and is not
+        tone_loss = -data.get('tone_level', 0)
+        sa_p_out = data['sa_p_out'] + sa_loss + tone_loss
+        sa_p_carr = data['sa_p_carr'] + sa_loss
+        sa_p_sb = data['sa_p_sb'] + sa_loss + tone_loss
+        sa_p_3_harm = data['sa_p_3_harm'] + sa_loss + tone_loss
 
         p_in_at_30_percent = -5.27  # p_in at 30%
         kp_out = sa_p_out - p_in_at_30_percent
@@ -60,7 +109,7 @@ class MeasureResult:
 
         if self.adjustment is not None:
             try:
-                point = self.adjustment[len(self._processed)]
+                point = self.adjustment[data.get('index', len(self._processed))]
                 kp_out += point['kp_out']
                 ap_carr += point['ap_carr']
                 a_sb += point['a_sb']
@@ -85,55 +134,222 @@ class MeasureResult:
 
             'src_u': src_u,
             'src_i': round(src_i, 2),
+            'src_i_min': round(src_i_min, 2),
+            'src_i_max': round(src_i_max, 2),
+
+            'avg_count': data.get('avg_count', 1),
+
+            **{axis: data[axis] for axis in self._sweep_axes if axis in data},
         }
 
-        lo_f_label = lo_f / GIGA
-        self.data1[lo_p].append([lo_f_label, kp_out])
-        self.data2[lo_p].append([lo_f_label, ap_carr])
-        self.data3[lo_p].append([lo_f_label, a_sb])
-        self.data4[lo_p].append([lo_f_label, a_3h])
         self._processed.append({**self._report})
+        self._cube = None
+        self._columns = None
+
+        if self.golden is not None:
+            deltas = self.golden.check(self._report) or {}
+            coords = self._coords(self._report)
+            if deltas:
+                # every sweep axes point is its own comparison against the same reference grid
+                key = (*coords.values(), lo_p, self._report['lo_f'])
+                self._golden_checked[key] = not all(passed for _, passed in deltas.values())
+            self.golden_failures.extend(
+                {'param': p, 'lo_p': lo_p, 'lo_f': self._report['lo_f'], 'value': self._report[p], 'delta': delta,
+                 'coords': coords}
+                for p, (delta, passed) in deltas.items() if not passed
+            )
+
+        if self._selection is None:
+            # plots follow the sweep, start over when it moves on to the next axes point
+            coords = self._coords(self._report)
+            if len(self._processed) > 1 and self._coords(self._processed[-2]) != coords:
+                self._clear_plots()
+            self._plot_point(self._report)
+        elif self._coords(self._report) == self._selection:
+            self._plot_point(self._report)
+
+    def _coords(self, point):
+        return {axis: point.get(axis) for axis in self._sweep_axes}
+
+    def _plot_point(self, point):
+        lo_p = point['lo_p']
+        lo_f_label = point['lo_f']
+        self.data1[lo_p].append([lo_f_label, point['kp_out']])
+        self.data2[lo_p].append([lo_f_label, point['ap_carr']])
+        self.data3[lo_p].append([lo_f_label, point['a_sb']])
+        self.data4[lo_p].append([lo_f_label, point['a_3h']])
+
+    def _clear_plots(self):
+        self.data1.clear()
+        self.data2.clear()
+        self.data3.clear()
+        self.data4.clear()
+
+    def select(self, **coords):
+        """Show the LO grid at the given sweep axes values, no arguments to follow the running sweep again."""
+        self._selection = {axis: coords[axis] for axis in self._sweep_axes} if coords else None
+        self._clear_plots()
+        if not self._processed:
+            return
+        for point in self.cube.points(**self.shown_coords):
+            self._plot_point(point)
+
+    @property
+    def current_pass(self):
+        return self._pass
+
+    @property
+    def sweep_axes(self):
+        return list(self._sweep_axes)
+
+    @property
+    def selection(self):
+        return dict(self._selection) if self._selection else None
+
+    @property
+    def shown_coords(self):
+        """Sweep axes values of the points on the plots: the selection, or the point the sweep is at."""
+        if self._selection is not None:
+            return dict(self._selection)
+        return self._coords(self._processed[-1]) if self._processed else None
+
+    def axis_points(self):
+        """Sweep axes values measured so far, in sweep order."""
+        if not self._sweep_axes:
+            return []
+        seen = list()
+        for point in self._processed:
+            coords = self._coords(point)
+            if coords not in seen:
+                seen.append(coords)
+        return seen
+
+    @property
+    def cube(self):
+        if self._cube is None and self._processed:
+            axes = self._sweep_axes + ['lo_p', 'lo_f']
+            params = [k for k in self._point_keys() if k not in axes]
+            self._cube = ResultCube.from_points(self._processed, axes, params)
+        return self._cube
+
+    def _point_keys(self):
+        return list(dict.fromkeys(k for p in self._processed for k in p))
 
     def clear(self):
         self._secondaryParams.clear()
         self._raw.clear()
         self._report.clear()
         self._processed.clear()
+        self._selection = None
+        self._cube = None
+        self._columns = None
+        self.golden_failures.clear()
+        self._golden_checked.clear()
+        self._pass = 0
 
-        self.data1.clear()
-        self.data2.clear()
-        self.data3.clear()
-        self.data4.clear()
+        self._clear_plots()
 
         self.adjustment = load_ast_if_exists(self._primary_params.get('adjust', ''), default={})
 
         self.ready = False
+        self.verdict = None
 
     def set_secondary_params(self, params):
         self._secondaryParams = dict(**params)
+        axes = list(params.get('sweep_axes', {}))
+        if params.get('mod_tones') and 'Fmod' not in axes:
+            # every multi-tone point comes back as one point per modulation frequency
+            axes.append('Fmod')
+        self._sweep_axes = sorted(
+            (axis for axis in axes if axis in axis_switch_cost),
+            key=lambda axis: -axis_switch_cost[axis]
+        )
 
     def set_primary_params(self, params):
         self._primary_params = dict(**params)
 
     def add_point(self, data):
+        if data.get('pass', 0) != self._pass:
+            self._next_pass(data.get('pass', 0))
         self._raw.append(data)
         self._process_point(data)
+        if self.soak is not None:
+            self.soak.add(self._report)
+
+    def _next_pass(self, number):
+        if self.soak is not None:
+            self.soak.end_pass()
+        self._pass = number
+        self._raw.clear()
+        self._processed.clear()
+        self._cube = None
+        self._columns = None
+        self.golden_failures.clear()
+        self._golden_checked.clear()
+        self._clear_plots()
 
     def save_adjustment_template(self):
         if not self.adjustment:
             print('measured, saving template')
+            # corrections are looked up by grid index, screening order and sweep axes measure a grid point
+            # out of order or more than once, so the template has one row per index in grid order
+            grid = dict()
+            for i, (raw, p) in enumerate(zip(self._raw, self._processed)):
+                grid.setdefault(raw.get('index', i), (p['lo_p'], p['lo_f']))
             self.adjustment = [{
-                'lo_p': p['lo_p'],
-                'lo_f': p['lo_f'],
+                'lo_p': grid.get(index, (None, None))[0],
+                'lo_f': grid.get(index, (None, None))[1],
                 'kp_out': 0,
                 'ap_carr': 0,
                 'a_sb': 0,
                 'a_3h': 0,
-            } for p in self._processed]
+            } for index in range(max(grid) + 1 if grid else 0)]
             pprint_to_file('adjust.ini', self.adjustment)
 
+    def columns(self):
+        """Processed points as `{key: array}`, built once per change of the result for the point table."""
+        if self._columns is None:
+            keys = list(dict.fromkeys(k for p in self._processed for k in p))
+            self._columns = {
+                k: np.fromiter((p.get(k, np.nan) for p in self._processed), dtype=np.float64, count=len(self._processed))
+                for k in keys
+            }
+        return self._columns
+
+    @property
+    def table_file(self):
+        return self._primary_params.get('result', '') if self._primary_params else ''
+
+    @property
+    def points(self):
+        return list(self._processed)
+
+    @property
+    def raw_points(self):
+        return list(self._raw)
+
+    @property
+    def golden_verdict(self):
+        if self.golden is None:
+            return None
+        return self.golden.verdict(len(self._golden_checked), sum(self._golden_checked.values()))
+
+    @property
+    def last_report(self):
+        return dict(self._report)
+
     @property
     def report(self):
+        verdict = f'\nЗаключение: {self.verdict}\n' if self.verdict else ''
+        axes = ''.join(f'{axis}={self._report[axis]}\n' for axis in self._sweep_axes if axis in self._report)
+        axes = f'\nРазвёртка:\n{axes}' if axes else ''
+        golden = f'\nЭталон: {self.golden_verdict}\n' if self.golden is not None else ''
+        if self.soak is not None:
+            golden += f'\nПрогон {self.soak.passes + 1}, {self.soak.hours:0.2f} ч\n' + ''.join(
+                f'Дрейф {p}: {stats.slope:+0.3f}/ч, σ={stats.sigma:0.3f} '
+                f'(Pгет={lo_p}, Fгет={lo_f})\n'
+                for p, ((lo_p, lo_f), stats) in self.soak.worst_drift().items()
+            )
         return dedent("""        Генератор:
         Pгет, дБм={lo_p}
         Fгет, ГГц={lo_f:0.2f}
@@ -142,8 +358,11 @@ class MeasureResult:
         Источник питания:
         U, В={src_u}
         I, мА={src_i}
+        Iмин, мА={src_i_min}
+        Iмакс, мА={src_i_max}
 
         Анализатор:
+        Nср={avg_count}
         Кп, дБ={kp_out:0.2f}
         Pвых., дБм={p_out:0.3f}
         Pнес., дБм={p_carr:0.3f}
@@ -154,35 +373,38 @@ class MeasureResult:
         αп.нес, дБ={ap_carr:0.3f}
         αбок, дБ={a_sb}
         αx3, дБ={a_3h}
-        """.format(**self._report))
+        """.format(**self._report)) + axes + golden + verdict
 
     def export_excel(self):
+        # pandas takes a good part of a second to import, only pay for it on export
+        import pandas as pd
+
         # TODO implement
         device = 'mod'
         path = 'xlsx'
         if not os.path.isdir(f'{path}'):
             os.makedirs(f'{path}')
         file_name = f'./{path}/{device}-{datetime.datetime.now().isoformat().replace(":", ".")}.xlsx'
-        df = pd.DataFrame(self._processed)
-
-        df.columns = [
-            'Pгет, дБм', 'Fгет, ГГц', 'Pпот, дБ',
-            'Кп, дБ',
-            'Pвых, дБм', 'Pнес, дБм', 'Pбок, дБм', 'P3г, дБм',
-            'αп.нес, дБ', 'αбок, дБ', 'αx3, дБ',
-            'Uпит, В', 'Iпит, мА',
-        ]
+        # with a sweep axes point selected only that slice of the cube is exported
+        if self._selection is None:
+            df = pd.DataFrame(self._processed)
+        else:
+            df = pd.DataFrame(self.cube.points(**self._selection), columns=self._point_keys())
+
+        df.columns = [column_labels.get(c, c) for c in df.columns]
         df.to_excel(file_name, engine='openpyxl', index=False)
 
         full_path = os.path.abspath(file_name)
         Popen(f'explorer /select,"{full_path}"')
 
     def _prepare_table_data(self):
-        table_file = self._primary_params.get('result', '')
+        table_file = self.table_file
 
         if not os.path.isfile(table_file):
             return
 
+        import openpyxl
+
         wb = openpyxl.load_workbook(table_file)
         ws = wb.active
 
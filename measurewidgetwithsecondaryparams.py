@@ -1,15 +1,40 @@
+import threading
+
 from PyQt5.QtCore import pyqtSignal, QTimer
 
 from mytools.measurewidget import MeasureWidget, MeasureTask, CancelToken
 from forgot_again.file import remove_if_exists
 
 
+class EventCancelToken(CancelToken):
+    # waits on the token return the moment it is cancelled instead of sleeping the full settle time
+    def __init__(self):
+        self._event = threading.Event()
+        super().__init__()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    @cancelled.setter
+    def cancelled(self, value):
+        if value:
+            self._event.set()
+        else:
+            self._event.clear()
+
+    def wait(self, timeout):
+        return self._event.wait(timeout)
+
+
 class MeasureWidgetWithSecondaryParameters(MeasureWidget):
     secondaryChanged = pyqtSignal(dict)
 
     def __init__(self, parent=None, controller=None):
         super().__init__(parent=parent, controller=controller)
 
+        self._token = EventCancelToken()
+
         self._uiDebouncer = QTimer()
         self._uiDebouncer.setSingleShot(True)
         self._uiDebouncer.timeout.connect(self.on_debounced_gui)
@@ -94,6 +119,134 @@ class MeasureWidgetWithSecondaryParameters(MeasureWidget):
                     'Avg.count=',
                     {'start': 0.0, 'end': 1000.0, 'step': 1.0, 'value': 16.0, 'suffix': ''}
                 ],
+                'sa_avg_adaptive': [
+                    'Avg.adaptive',
+                    {'value': False}
+                ],
+                'sa_avg_tol': [
+                    'Avg.tol.=',
+                    {'start': 0.0, 'end': 10.0, 'step': 0.01, 'decimals': 2, 'value': 0.1, 'suffix': ' дБ'}
+                ],
+                'mult_buffered': [
+                    'Iпит. буфер',
+                    {'value': False}
+                ],
+                'mult_nplc': [
+                    'NPLC=',
+                    {'start': 0.02, 'end': 100.0, 'step': 0.1, 'decimals': 2, 'value': 1.0, 'suffix': ''}
+                ],
+                'mult_samples': [
+                    'Iпит. отсчётов=',
+                    {'start': 1.0, 'end': 1000.0, 'step': 1.0, 'value': 10.0, 'suffix': ''}
+                ],
+                'sa_zero_span': [
+                    'Нулевая полоса',
+                    {'value': False}
+                ],
+                'prod_mode': [
+                    'Производство',
+                    {'value': False}
+                ],
+                'prod_screen_first': [
+                    'Скрининг',
+                    {'value': False}
+                ],
+                'prod_sigma': [
+                    'σизм=',
+                    {'start': 0.0, 'end': 10.0, 'step': 0.05, 'decimals': 2, 'value': 0.2, 'suffix': ' дБ'}
+                ],
+                'prod_confidence': [
+                    'Достоверность=',
+                    {'start': 0.5, 'end': 0.9999, 'step': 0.001, 'decimals': 4, 'value': 0.997, 'suffix': ''}
+                ],
+                'profile': [
+                    'Профилирование',
+                    {'value': False}
+                ],
+                'profile_live': [
+                    'Профиль по точкам',
+                    {'value': False}
+                ],
+                'cal_incremental': [
+                    'Кал. по точкам',
+                    {'value': True}
+                ],
+                'cal_spot_count': [
+                    'Кал. точек проверки=',
+                    {'start': 2.0, 'end': 100.0, 'step': 1.0, 'value': 8.0, 'suffix': ''}
+                ],
+                'cal_tolerance': [
+                    'Кал. допуск=',
+                    {'start': 0.0, 'end': 10.0, 'step': 0.1, 'decimals': 2, 'value': 0.3, 'suffix': ' дБ'}
+                ],
+                'cal_max_age': [
+                    'Кал. срок=',
+                    {'start': 0.0, 'end': 365.0, 'step': 1.0, 'value': 30.0, 'suffix': ' дн'}
+                ],
+                'cal_timing': [
+                    'Кал. времени установления',
+                    {'value': False}
+                ],
+                'timing_tolerance': [
+                    'Допуск установления=',
+                    {'start': 0.01, 'end': 10.0, 'step': 0.01, 'decimals': 2, 'value': 0.1, 'suffix': ' дБ'}
+                ],
+                'timing_margin': [
+                    'Запас времени=',
+                    {'start': 1.0, 'end': 5.0, 'step': 0.1, 'decimals': 2, 'value': 1.2, 'suffix': ''}
+                ],
+                'live_stream': [
+                    'Трансляция',
+                    {'value': False}
+                ],
+                'live_port': [
+                    'Порт=',
+                    {'start': 1024.0, 'end': 65535.0, 'step': 1.0, 'value': 8765.0, 'suffix': ''}
+                ],
+                'store_results': [
+                    'Сохранять в базу',
+                    {'value': True}
+                ],
+                'temperature': [
+                    'T=',
+                    {'start': -60.0, 'end': 150.0, 'step': 1.0, 'value': 25.0, 'suffix': ' °C'}
+                ],
+                'soak': [
+                    'Мониторинг',
+                    {'value': False}
+                ],
+                'soak_hours': [
+                    'Длительность=',
+                    {'start': 0.0, 'end': 1000.0, 'step': 1.0, 'value': 24.0, 'suffix': ' ч'}
+                ],
+                'pipelined': [
+                    'Конвейер',
+                    {'value': False}
+                ],
+                'scpi_batch': [
+                    'Пакетная запись SCPI',
+                    {'value': False}
+                ],
+                'scpi_batch_limit': [
+                    'Размер пакета=',
+                    {'start': 32.0, 'end': 4096.0, 'step': 32.0, 'value': 256.0, 'suffix': ' байт'}
+                ],
+                'engine_process': [
+                    'Отдельный процесс',
+                    {'value': False}
+                ],
+                'trace_record': [
+                    'Запись SCPI',
+                    {'value': False}
+                ],
+                'trace_replay': [
+                    'Воспроизведение SCPI',
+                    {'value': False}
+                ],
+                'trace_replay_realtime': [
+                    'В реальном времени',
+                    {'value': False}
+                ],
             }
             , parent=self)
 
@@ -114,7 +267,7 @@ class MeasureWidgetWithSecondaryParameters(MeasureWidget):
     def checkTaskComplete(self):
         res = super(MeasureWidgetWithSecondaryParameters, self).checkTaskComplete()
         if not res:
-            self._token = CancelToken()
+            self._token = EventCancelToken()
         return res
 
     def calibrate(self, what):
@@ -147,7 +300,7 @@ class MeasureWidgetWithSecondaryParameters(MeasureWidget):
     def measureTaskComplete(self):
         res = super(MeasureWidgetWithSecondaryParameters, self).measureTaskComplete()
         if not res:
-            self._token = CancelToken()
+            self._token = EventCancelToken()
             self._modePreCheck()
         return res
 
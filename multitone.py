@@ -0,0 +1,113 @@
+import hashlib
+import math
+import re
+
+import numpy as np
+
+
+def newman_phases(count):
+    # quadratic phases keep the peak of equal amplitude tones close to that of a single tone
+    k = np.arange(count)
+    return np.pi * k ** 2 / count
+
+
+def synthesize(freqs, oversample=8, min_rate=1e6, max_rate=100e6, min_samples=512, max_samples=2 ** 20):
+    """Equal amplitude complex tones at `freqs` Hz with the peak normalized to 1.
+
+    Returns the samples, the sample rate and the amplitude every tone is left with.
+
+    The record holds a whole number of periods of every tone, so the ARB loops it without a
+    phase jump: its length is the sample rate over the greatest common divisor of the tones.
+    """
+    freqs = [int(round(f)) for f in freqs]
+    step = math.gcd(*freqs)
+    if not step:
+        raise ValueError('modulation tones must be above 0 Hz')
+    period = math.ceil(min(max(min_rate, oversample * max(freqs)), max_rate) / step)
+    period += period % 2
+    rate = period * step
+    if max(freqs) > 0.4 * rate:
+        raise ValueError(f'tones up to {max(freqs)} Hz do not fit the {max_rate} Hz ARB sample rate')
+    # short records are repeated up to the least the ARB plays
+    samples = period * math.ceil(min_samples / period)
+    if samples > max_samples:
+        raise ValueError(f'tones {freqs} need {samples} samples, more than the {max_samples} the ARB takes')
+
+    t = np.arange(samples) / rate
+    iq = np.sum([np.exp(1j * (2 * np.pi * f * t + phase)) for f, phase in zip(freqs, newman_phases(len(freqs)))], axis=0)
+    peak = np.max(np.abs(iq))
+    return iq / peak, rate, 1 / peak
+
+
+def iq_bytes(iq):
+    # interleaved I and Q, signed 16 bit big endian, the generator waveform file format
+    data = np.empty(2 * len(iq), dtype='>i2')
+    data[0::2] = np.round(iq.real * 32767)
+    data[1::2] = np.round(iq.imag * 32767)
+    return data.tobytes()
+
+
+class MultiToneWaveform:
+    def __init__(self, freqs, **kwargs):
+        self.freqs = sorted(freqs)
+        iq, self.sample_rate, amplitude = synthesize(self.freqs, **kwargs)
+        # with the peak at full scale every tone sits this far below a single tone, dB
+        self.tone_level = 20 * math.log10(amplitude)
+        self.data = iq_bytes(iq)
+        # the name is the content hash, a waveform already in the generator memory is the same waveform
+        digest = hashlib.sha1(self.data + f'{self.sample_rate}'.encode()).hexdigest()
+        self.name = f'MT_{digest[:12].upper()}'
+
+    def __len__(self):
+        return len(self.data) // 4
+
+
+def catalog_names(response):
+    # MMEM:CAT? answers `used,free,"name,type,size",...`
+    return set(re.findall(r'"([^",]+)', response))
+
+
+def upload_if_missing(gen, waveform, memory='WFM1'):
+    """Writes the waveform into the generator volatile ARB memory unless it is there already.
+
+    The block is written with `write_raw`, the instrument session is assumed to take bytes as is.
+    """
+    if waveform.name in catalog_names(gen.query(f':MMEM:CAT? "{memory}:"')):
+        print(f'waveform {waveform.name} already loaded')
+        return False
+
+    size = f'{len(waveform.data)}'
+    header = f':MMEM:DATA "{memory}:{waveform.name}",#{len(size)}{size}'.encode('ascii')
+    gen.write_raw(header + waveform.data + b'\n')
+    print(f'waveform {waveform.name} uploaded: {len(waveform)} samples at {waveform.sample_rate} Hz')
+    return True
+
+
+def tone_groups(freq_sa, mod_freqs, inverted):
+    """Output, carrier, sideband and 3rd harmonic frequencies for every modulation tone."""
+    sign = -1 if inverted else 1
+    return [
+        [freq_sa - sign * f, freq_sa, freq_sa + sign * f, freq_sa + sign * 3 * f]
+        for f in mod_freqs
+    ]
+
+
+def collisions(mod_freqs, min_spacing):
+    """Pairs of modulation tones whose output, sideband or harmonic lines fall within `min_spacing` Hz."""
+    lines = sorted(
+        (offset, f)
+        for f, group in zip(mod_freqs, tone_groups(0, mod_freqs, False))
+        for offset in [group[0], group[2], group[3]]
+    )
+    return sorted({
+        (min(a[1], b[1]), max(a[1], b[1]))
+        for a, b in zip(lines, lines[1:]) if a[1] != b[1] and b[0] - a[0] < min_spacing
+    })
+
+
+def trace_levels(start, stop, levels, freqs):
+    """Peak level within one bin of each frequency on a trace from `start` to `stop` Hz."""
+    levels = np.asarray(levels)
+    bin_width = (stop - start) / (len(levels) - 1)
+    idx = np.clip(np.round((np.asarray(freqs) - start) / bin_width).astype(int), 1, len(levels) - 2)
+    return [float(v) for v in np.max([levels[idx - 1], levels[idx], levels[idx + 1]], axis=0)]
@@ -0,0 +1,157 @@
+import operator
+import re
+
+import numpy as np
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QVariant
+from PyQt5.QtGui import QColor
+
+from measureresult import column_labels
+
+
+_int_columns = {'index', 'avg_count', 'pass'}
+
+_operators = {
+    '<=': operator.le,
+    '>=': operator.ge,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '>': operator.gt,
+    '=': np.isclose,
+}
+
+_condition = re.compile(r'^\s*(.+?)\s*(<=|>=|!=|<|>|=)\s*(-?[\d.eE+-]+)\s*$')
+
+_fail_color = QColor(255, 200, 200)
+
+
+def parse_filter(text, keys):
+    """Conditions like `kp_out < 10; Pгет, дБм = -5` as `[(key, op, value)]`, keys are matched by name or label."""
+    by_label = {column_labels.get(k, k).lower(): k for k in keys}
+    conditions = list()
+    for part in filter(None, (p.strip() for p in text.split(';'))):
+        match = _condition.match(part)
+        if not match:
+            raise ValueError(f'bad condition: {part}')
+        name, op, value = match.groups()
+        key = name if name in keys else by_label.get(name.lower())
+        if key is None:
+            raise ValueError(f'no column {name}')
+        conditions.append((key, _operators[op], float(value)))
+    return conditions
+
+
+class PointTableModel(QAbstractTableModel):
+    """Processed points straight from the result column arrays.
+
+    Sorting and filtering only reorder an index array, rows are handed to the view in batches
+    as it scrolls and cells are formatted when the view asks for them.
+    """
+
+    batch = 1000
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self._keys = list()
+        self._columns = dict()
+        self._fails = dict()
+        self._rows = np.empty(0, dtype=np.intp)
+        self._loaded = 0
+
+    def update(self, columns, limits=None):
+        self.beginResetModel()
+        self._keys = list(columns)
+        self._columns = columns
+        # limit checks are done once for the whole column, data() only looks the result up
+        self._fails = dict()
+        for key in self._keys:
+            lo, hi = limits.get(key, (None, None)) if limits else (None, None)
+            if lo is not None:
+                with np.errstate(invalid='ignore'):
+                    self._fails[key] = (columns[key] < lo) | (columns[key] > hi)
+        self._rows = np.arange(self.total, dtype=np.intp)
+        self._loaded = min(self.batch, len(self._rows))
+        self.endResetModel()
+
+    @property
+    def keys(self):
+        return list(self._keys)
+
+    @property
+    def total(self):
+        return len(next(iter(self._columns.values()))) if self._columns else 0
+
+    @property
+    def shown(self):
+        return len(self._rows)
+
+    def set_filter(self, conditions):
+        mask = np.ones(self.total, dtype=bool)
+        with np.errstate(invalid='ignore'):
+            for key, op, value in conditions:
+                mask &= op(self._columns[key], value)
+        self.beginResetModel()
+        self._rows = np.flatnonzero(mask)
+        self._loaded = min(self.batch, len(self._rows))
+        self.endResetModel()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if not 0 <= column < len(self._keys):
+            return
+        self.layoutAboutToBeChanged.emit()
+        values = self._columns[self._keys[column]][self._rows]
+        # stable, so sorting by one column after another keeps the previous order within ties, NaN go last
+        rows = self._rows[np.argsort(values, kind='stable')]
+        if order == Qt.DescendingOrder:
+            nan = np.isnan(self._columns[self._keys[column]][rows])
+            rows = np.concatenate([rows[~nan][::-1], rows[nan]])
+        self._rows = rows
+        self.layoutChanged.emit()
+
+    def headerData(self, section, orientation, role=None):
+        if role != Qt.DisplayRole:
+            return QVariant()
+        if orientation == Qt.Horizontal:
+            if section < len(self._keys):
+                return QVariant(column_labels.get(self._keys[section], self._keys[section]))
+        elif section < self._loaded:
+            return QVariant(int(self._rows[section]) + 1)
+        return QVariant()
+
+    def rowCount(self, parent=None, *args, **kwargs):
+        if parent is not None and parent.isValid():
+            return 0
+        return self._loaded
+
+    def columnCount(self, parent=None, *args, **kwargs):
+        return len(self._keys)
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and self._loaded < len(self._rows)
+
+    def fetchMore(self, parent):
+        count = min(self.batch, len(self._rows) - self._loaded)
+        self.beginInsertRows(parent, self._loaded, self._loaded + count - 1)
+        self._loaded += count
+        self.endInsertRows()
+
+    def data(self, index, role=None):
+        if not index.isValid():
+            return QVariant()
+        key = self._keys[index.column()]
+        row = self._rows[index.row()]
+        if role == Qt.DisplayRole:
+            value = self._columns[key][row]
+            if np.isnan(value):
+                return QVariant('-')
+            if key in _int_columns:
+                return QVariant(str(int(value)))
+            return QVariant(f'{value:.6g}')
+        if role == Qt.BackgroundRole:
+            fails = self._fails.get(key)
+            if fails is not None and fails[row]:
+                return QVariant(_fail_color)
+        if role == Qt.TextAlignmentRole:
+            return QVariant(int(Qt.AlignRight | Qt.AlignVCenter))
+        return QVariant()
@@ -0,0 +1,50 @@
+from PyQt5.QtWidgets import QHeaderView, QLabel, QLineEdit, QTableView, QVBoxLayout, QWidget
+
+from pointtablemodel import PointTableModel, parse_filter
+from speclimits import SpecLimits
+
+
+class PointTableWidget(QWidget):
+
+    def __init__(self, parent=None, controller=None):
+        super().__init__(parent=parent)
+
+        self._controller = controller
+
+        self._model = PointTableModel(parent=self)
+        self._table = QTableView()
+        self._table.setModel(self._model)
+        self._table.setSortingEnabled(True)
+        # per-row height and width measuring is what makes big tables slow, every row is the same anyway
+        self._table.verticalHeader().setDefaultSectionSize(20)
+        self._table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+
+        self._editFilter = QLineEdit()
+        self._editFilter.setPlaceholderText('Фильтр: kp_out < 10; lo_p = -5')
+        self._editFilter.editingFinished.connect(self.on_filter_changed)
+
+        self._labelCount = QLabel()
+
+        self._layout = QVBoxLayout()
+        self._layout.addWidget(self._editFilter)
+        self._layout.addWidget(self._table)
+        self._layout.addWidget(self._labelCount)
+
+        self.setLayout(self._layout)
+
+    def updateResult(self):
+        result = self._controller.result
+        self._model.update(result.columns(), SpecLimits.from_table(result.table_file))
+        self._table.resizeColumnsToContents()
+        self.on_filter_changed()
+
+    def on_filter_changed(self):
+        try:
+            conditions = parse_filter(self._editFilter.text(), self._model.keys)
+        except ValueError as ex:
+            self._labelCount.setText(f'{ex}')
+            return
+        self._model.set_filter(conditions)
+        header = self._table.horizontalHeader()
+        self._model.sort(header.sortIndicatorSection(), header.sortIndicatorOrder())
+        self._labelCount.setText(f'точек: {self._model.shown} из {self._model.total}')
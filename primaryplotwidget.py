@@ -1,6 +1,6 @@
 import pyqtgraph as pg
 
-from PyQt5.QtWidgets import QGridLayout, QWidget, QLabel
+from PyQt5.QtWidgets import QComboBox, QGridLayout, QWidget, QLabel
 from PyQt5.QtCore import Qt
 
 
@@ -28,8 +28,14 @@ class PrimaryPlotWidget(QWidget):
         self._stat_label = QLabel('Mouse:')
         self._stat_label.setAlignment(Qt.AlignRight)
 
-        self._grid.addWidget(self._stat_label, 0, 0)
-        self._grid.addWidget(self._win, 1, 0)
+        # sweep axes point the plots and the excel export show, the first item follows the running sweep
+        self._comboAxes = QComboBox()
+        self._comboAxes.addItem('Текущая точка развёртки', None)
+        self._comboAxes.currentIndexChanged.connect(self.on_axes_selected)
+
+        self._grid.addWidget(self._comboAxes, 0, 0)
+        self._grid.addWidget(self._stat_label, 0, 1)
+        self._grid.addWidget(self._win, 1, 0, 1, 2)
 
         self._plot_00 = self._win.addPlot(row=1, col=0)
         self._plot_01 = self._win.addPlot(row=1, col=1)
@@ -40,6 +46,9 @@ class PrimaryPlotWidget(QWidget):
         self._curves_01 = dict()
         self._curves_10 = dict()
         self._curves_11 = dict()
+        self._envelope_items = list()
+        self._golden_items = list()
+        self._golden_marks = dict()
 
         self._plot_00.setLabel('left', 'Кп, дБ', **self.label_style)
         self._plot_00.setLabel('bottom', 'Fгет, ГГц', **self.label_style)
@@ -164,6 +173,16 @@ class PrimaryPlotWidget(QWidget):
             ]))
 
     def clear(self):
+        self._clear_curves()
+        self.clear_envelope()
+        self._clear_golden()
+
+        # a new run starts over following the sweep
+        self._comboAxes.blockSignals(True)
+        self._reset_axes()
+        self._comboAxes.blockSignals(False)
+
+    def _clear_curves(self):
         def _remove_curves(plot, curve_dict):
             for _, curve in curve_dict.items():
                 plot.removeItem(curve)
@@ -178,17 +197,115 @@ class PrimaryPlotWidget(QWidget):
         self._curves_10.clear()
         self._curves_11.clear()
 
+    def _clear_golden(self):
+        for plot, item in self._golden_items:
+            plot.removeItem(item)
+        self._golden_items.clear()
+        self._golden_marks.clear()
+
+    def _plot_golden(self, result):
+        # golden unit tolerance band per LO power, out of tolerance points marked red
+        plots = [
+            ('kp_out', self._plot_00),
+            ('ap_carr', self._plot_01),
+            ('a_sb', self._plot_10),
+            ('a_3h', self._plot_11),
+        ]
+        if not self._golden_items:
+            for param, plot in plots:
+                for i, (pow_lo, (freqs, values, tolerances)) in enumerate(result.golden.curves(param).items()):
+                    color = colors[i % len(colors)]
+                    fill = pg.mkColor(color)
+                    fill.setAlpha(40)
+                    pen = pg.mkPen(color=color, width=1, style=Qt.DotLine)
+                    lower = pg.PlotDataItem(freqs, values - tolerances, pen=pen, connect='finite')
+                    upper = pg.PlotDataItem(freqs, values + tolerances, pen=pen, connect='finite')
+                    band = pg.FillBetweenItem(lower, upper, brush=pg.mkBrush(fill))
+                    for item in [lower, upper, band]:
+                        plot.addItem(item)
+                        self._golden_items.append((plot, item))
+
+                marks = pg.ScatterPlotItem(symbol='x', size=10, pen=pg.mkPen('r', width=2), brush=pg.mkBrush('r'))
+                plot.addItem(marks)
+                self._golden_items.append((plot, marks))
+                self._golden_marks[param] = marks
+
+        # marks of the axes point the plots show, the others are on the same grid
+        coords = result.shown_coords
+        for param, marks in self._golden_marks.items():
+            failed = [f for f in result.golden_failures if f['param'] == param and f['coords'] == coords]
+            marks.setData([f['lo_f'] for f in failed], [f['value'] for f in failed])
+
+    def clear_envelope(self):
+        for plot, item in self._envelope_items:
+            plot.removeItem(item)
+        self._envelope_items.clear()
+
+    def plot_envelope(self, stats, low='p5', high='p95', combo=0):
+        # lot statistics: mean as a dashed line inside a percentile band per LO power
+        self.clear_envelope()
+        plots = [
+            ('kp_out', self._plot_00),
+            ('ap_carr', self._plot_01),
+            ('a_sb', self._plot_10),
+            ('a_3h', self._plot_11),
+        ]
+        for param, plot in plots:
+            values = stats.param(param, combo)
+            for i, pow_lo in enumerate(stats.powers):
+                color = colors[i % len(colors)]
+                lower = pg.PlotDataItem(stats.freqs, values[low][i], pen=pg.mkPen(color=color, width=1), connect='finite')
+                upper = pg.PlotDataItem(stats.freqs, values[high][i], pen=pg.mkPen(color=color, width=1), connect='finite')
+                fill = pg.mkColor(color)
+                fill.setAlpha(50)
+                band = pg.FillBetweenItem(lower, upper, brush=pg.mkBrush(fill))
+                mean = pg.PlotDataItem(
+                    stats.freqs,
+                    values['mean'][i],
+                    pen=pg.mkPen(color=color, width=2, style=Qt.DashLine),
+                    connect='finite',
+                    name=f'Pгет= {pow_lo} дБм, партия'
+                )
+                for item in [lower, upper, band, mean]:
+                    plot.addItem(item)
+                    self._envelope_items.append((plot, item))
+
+    def updateAxes(self):
+        result = self._controller.result
+        selection = result.selection
+        self._comboAxes.blockSignals(True)
+        self._reset_axes()
+        for coords in result.axis_points():
+            self._comboAxes.addItem(', '.join(f'{k}={v}' for k, v in coords.items()), coords)
+            if coords == selection:
+                self._comboAxes.setCurrentIndex(self._comboAxes.count() - 1)
+        self._comboAxes.blockSignals(False)
+
+    def _reset_axes(self):
+        self._comboAxes.setCurrentIndex(0)
+        while self._comboAxes.count() > 1:
+            self._comboAxes.removeItem(1)
+
+    def on_axes_selected(self, index):
+        coords = self._comboAxes.itemData(index)
+        self._controller.result.select(**(coords or {}))
+        # curves of LO powers the selected point does not have would otherwise stay on the plots
+        self._clear_curves()
+        self.plot()
+
     def plot(self):
         print('plotting primary stats')
         _plot_curves(self._controller.result.data1, self._curves_00, self._plot_00, prefix='Pгет= ', suffix=' дБм')
         _plot_curves(self._controller.result.data2, self._curves_01, self._plot_01, prefix='Pгет= ', suffix=' дБм')
         _plot_curves(self._controller.result.data3, self._curves_10, self._plot_10, prefix='Pгет= ', suffix=' дБм')
         _plot_curves(self._controller.result.data4, self._curves_11, self._plot_11, prefix='Pгет= ', suffix=' дБм')
+        if self._controller.result.golden is not None:
+            self._plot_golden(self._controller.result)
 
 
 def _plot_curves(datas, curves, plot, prefix='', suffix=''):
     for pow_lo, data in datas.items():
-        curve_xs, curve_ys = zip(*data)
+        curve_xs, curve_ys = zip(*sorted(data))
         try:
             curves[pow_lo].setData(x=curve_xs, y=curve_ys)
         except KeyError:
@@ -0,0 +1,129 @@
+import argparse
+import os
+import sys
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+from forgot_again.file import load_ast_if_exists
+
+from calibration import rf_table
+from measureresult import MeasureResult
+from resultstore import ResultStore
+
+
+# per worker process state, set once by _init_worker instead of being pickled with every run
+_worker = dict()
+
+
+def _init_worker(store_path, adjustment, calibration):
+    _worker['store'] = ResultStore(store_path)
+    _worker['adjustment'] = adjustment
+    _worker['calibration'] = calibration
+
+
+def analyzer_loss(raw_point, calibration, div2=False):
+    """Analyzer path correction of a raw point by a new calibration, halved the way the sweep does it.
+
+    The LO power was set with the loss known at measurement time, so only the analyzer side changes.
+    """
+    lo_p, lo_f = raw_point['lo_p'], raw_point['lo_f']
+    loss = calibration.get('lo', {}).get(lo_p, {}).get(lo_f)
+    # the RF table is keyed by the analyzer frequency, the stored LO one is the generator's
+    rf_loss = rf_table(calibration.get('rf', {})).get(lo_f / 2 if div2 else lo_f)
+    if rf_loss is not None:
+        return rf_loss / 2
+    if loss is not None:
+        return loss / 2
+    return raw_point.get('rf_loss', raw_point['loss'])
+
+
+def reprocess_points(raw_points, adjustment, calibration=None, secondary=None):
+    result = MeasureResult()
+    # the run's own sweep axes and tones, so the points come out with the columns they were stored with
+    result.set_secondary_params(secondary or {})
+    result.adjustment = adjustment
+    # the result keeps only the current soak pass, every pass of the run is collected here
+    points = list()
+    div2 = (secondary or {}).get('is_Flo_div2', False)
+    for point in raw_points:
+        if calibration:
+            point = {**point, 'rf_loss': analyzer_loss(point, calibration, div2)}
+        result.add_point(point)
+        points.append(result.last_report)
+    return points
+
+
+def _reprocess_run(run_id):
+    store = _worker['store']
+    secondary = store.info(run_id)['secondary']
+    points = reprocess_points(store.load_raw(run_id), _worker['adjustment'], _worker['calibration'], secondary)
+    return run_id, points
+
+
+def reprocess(store_path, run_ids, adjustment, calibration=None, inputs=None, workers=None, chunk=64):
+    """Re-process the stored raw points of `run_ids` across a process pool, each run gets a new version.
+
+    Returns the run, point and elapsed time counts.
+    """
+    workers = workers or os.cpu_count()
+    started = time.perf_counter()
+    point_count = 0
+
+    store = ResultStore(store_path)
+    pending = list()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(store_path, adjustment, calibration)) as pool:
+            # small chunks per task keep the workers busy without one process holding most of the runs
+            for run_id, points in pool.map(_reprocess_run, run_ids, chunksize=max(1, len(run_ids) // (workers * 8))):
+                pending.append((run_id, points))
+                point_count += len(points)
+                if len(pending) == chunk:
+                    store.add_versions(pending, inputs)
+                    pending.clear()
+                    print(f'processed {point_count} points')
+        if pending:
+            store.add_versions(pending, inputs)
+    finally:
+        store.close()
+
+    return len(run_ids), point_count, time.perf_counter() - started
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='re-process stored runs with new adjustment and calibration')
+    parser.add_argument('--db', default='results.db')
+    parser.add_argument('--adjust', default='', help='adjustment file, no adjustment if omitted')
+    parser.add_argument('--cal', default='', help='calibration file, the stored correction is kept if omitted')
+    parser.add_argument('--device')
+    parser.add_argument('--lot')
+    parser.add_argument('--serial')
+    parser.add_argument('--since', help='ISO timestamp')
+    parser.add_argument('--until', help='ISO timestamp')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(args)
+
+    store = ResultStore(args.db)
+    run_ids = [r['id'] for r in store.find(device=args.device, lot=args.lot, serial=args.serial,
+                                           since=args.since, until=args.until)]
+    store.close()
+    if not run_ids:
+        print('no runs found')
+        return
+
+    adjustment = load_ast_if_exists(args.adjust, default={})
+    calibration = load_ast_if_exists(args.cal, default={})
+    inputs = {
+        'adjust': args.adjust,
+        'cal': args.cal,
+        'cal_created': calibration.get('meta', {}).get('created'),
+    }
+    runs, points, elapsed = reprocess(args.db, run_ids, adjustment, calibration, inputs, args.workers)
+    print(f'{runs} runs, {points} points in {elapsed:.1f}s: '
+          f'{runs / elapsed:.1f} runs/s, {points / elapsed:.0f} points/s, {args.workers or os.cpu_count()} workers')
+
+
+if __name__ == '__main__':
+    # python reprocess.py --lot L042 --adjust adjust_+25.ini --cal cal.ini
+    main(sys.argv[1:])
@@ -0,0 +1,67 @@
+import numpy as np
+
+
+# relative cost of changing a parameter between grid passes, supply changes settle the longest
+axis_switch_cost = {
+    'Usrc': 3,
+    'UsrcD': 3,
+    'Uoffs': 2,
+    'Umod': 2,
+    'Fmod': 1,
+}
+
+cube_params = ['kp_out', 'ap_carr', 'a_sb', 'a_3h', 'p_out', 'p_carr', 'p_sb', 'p_3_harm', 'src_i']
+
+
+def ordered_axes(sweep_axes):
+    # the most expensive axis goes outermost so it is switched the fewest times
+    unknown = set(sweep_axes) - set(axis_switch_cost)
+    if unknown:
+        print(f'ignoring unsupported sweep axes: {sorted(unknown)}')
+    return {
+        k: list(sweep_axes[k])
+        for k in sorted((k for k in sweep_axes if k in axis_switch_cost), key=lambda k: -axis_switch_cost[k])
+    }
+
+
+class ResultCube:
+    def __init__(self, axes, params=None):
+        self.axes = {k: list(v) for k, v in axes.items()}
+        self.params = list(params or cube_params)
+        self._index = {k: {v: i for i, v in enumerate(vs)} for k, vs in self.axes.items()}
+        self.data = np.full([len(v) for v in self.axes.values()] + [len(self.params)], np.nan)
+
+    @classmethod
+    def from_points(cls, points, axis_names, params=None):
+        axes = {k: sorted({p[k] for p in points}) for k in axis_names}
+        cube = cls(axes, params)
+        for p in points:
+            cube.set(p, p)
+        return cube
+
+    def set(self, coords, values):
+        idx = tuple(self._index[k][coords[k]] for k in self.axes)
+        self.data[idx] = [values.get(p, np.nan) for p in self.params]
+
+    def slice(self, **fixed):
+        """Sub-cube with the given axes fixed to a value, returns the remaining axes and the data."""
+        idx = tuple(self._index[k][fixed[k]] if k in fixed else slice(None) for k in self.axes)
+        return {k: v for k, v in self.axes.items() if k not in fixed}, self.data[idx]
+
+    def param(self, name):
+        return self.data[..., self.params.index(name)]
+
+    def points(self, **fixed):
+        """Cells of the slice as point dicts in grid order, cells no point was set for are left out."""
+        axes, data = self.slice(**fixed)
+        rows = list()
+        for idx in np.ndindex(data.shape[:-1]):
+            values = data[idx]
+            if np.isnan(values).all():
+                continue
+            rows.append({
+                **fixed,
+                **{k: axes[k][i] for k, i in zip(axes, idx)},
+                **dict(zip(self.params, values.tolist())),
+            })
+        return rows
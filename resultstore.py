@@ -0,0 +1,229 @@
+import datetime
+import json
+import sqlite3
+import zlib
+
+import numpy as np
+
+
+_int_columns = {'index', 'avg_count', 'pass'}
+
+_schema = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started TEXT NOT NULL,
+    device TEXT,
+    serial TEXT,
+    lot TEXT,
+    operator TEXT,
+    temperature REAL,
+    verdict TEXT,
+    point_count INTEGER,
+    params TEXT,
+    secondary TEXT,
+    calibration TEXT,
+    columns TEXT,
+    data BLOB,
+    raw_columns TEXT,
+    raw BLOB
+);
+CREATE TABLE IF NOT EXISTS run_versions (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    version INTEGER NOT NULL,
+    created TEXT NOT NULL,
+    inputs TEXT,
+    columns TEXT,
+    data BLOB,
+    PRIMARY KEY (run_id, version)
+);
+CREATE TABLE IF NOT EXISTS run_passes (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    pass INTEGER NOT NULL,
+    columns TEXT,
+    data BLOB,
+    raw_columns TEXT,
+    raw BLOB,
+    PRIMARY KEY (run_id, pass)
+);
+CREATE TABLE IF NOT EXISTS run_powers (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    lo_p REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_started ON runs(started);
+CREATE INDEX IF NOT EXISTS runs_serial ON runs(serial);
+CREATE INDEX IF NOT EXISTS runs_lot ON runs(lot, temperature);
+CREATE INDEX IF NOT EXISTS runs_device ON runs(device, started);
+CREATE INDEX IF NOT EXISTS run_powers_lo_p ON run_powers(lo_p, run_id);
+"""
+
+_meta_columns = ['id', 'started', 'device', 'serial', 'lot', 'operator', 'temperature', 'verdict', 'point_count']
+
+
+def pack_columns(points):
+    """Points as one float64 column per key, zlib-compressed, returns the key list and the blob."""
+    columns = list(dict.fromkeys(k for p in points for k in p))
+    table = np.array([[p.get(c, np.nan) for p in points] for c in columns], dtype=np.float64)
+    return columns, zlib.compress(table.tobytes())
+
+
+def unpack_columns(columns, blob):
+    table = np.frombuffer(zlib.decompress(blob), dtype=np.float64).reshape(len(columns), -1)
+    return dict(zip(columns, table))
+
+
+def concat_columns(parts):
+    """Column dicts one after another, a key missing from a part is NaN for its points."""
+    if len(parts) == 1:
+        return parts[0]
+    keys = list(dict.fromkeys(k for part in parts for k in part))
+    counts = [len(next(iter(part.values()))) if part else 0 for part in parts]
+    return {
+        k: np.concatenate([part[k] if k in part else np.full(n, np.nan) for part, n in zip(parts, counts)])
+        for k in keys
+    }
+
+
+class ResultStore:
+    """Finished runs in a local SQLite file, metadata in indexed columns, point data as a columnar blob per run."""
+
+    def __init__(self, path='results.db'):
+        self._con = sqlite3.connect(path, check_same_thread=False)
+        self._con.execute('PRAGMA foreign_keys = ON')
+        self._con.executescript(_schema)
+
+    def close(self):
+        self._con.close()
+
+    def add(self, points, raw_points, device=None, params=None, secondary=None, calibration=None,
+            serial=None, lot=None, operator=None, temperature=None, verdict=None, started=None):
+        columns, data = pack_columns(points)
+        raw_columns, raw = pack_columns(raw_points)
+        with self._con:
+            cur = self._con.execute(
+                'INSERT INTO runs (started, device, serial, lot, operator, temperature, verdict, point_count, '
+                'params, secondary, calibration, columns, data, raw_columns, raw) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    started or datetime.datetime.now().isoformat(), device, serial, lot, operator, temperature, verdict,
+                    len(points), json.dumps(params, ensure_ascii=False), json.dumps(secondary, ensure_ascii=False),
+                    json.dumps(calibration, ensure_ascii=False), json.dumps(columns), data, json.dumps(raw_columns), raw,
+                )
+            )
+            run_id = cur.lastrowid
+            self._con.executemany(
+                'INSERT INTO run_powers (run_id, lo_p) VALUES (?, ?)',
+                [(run_id, p) for p in sorted({p['lo_p'] for p in points if 'lo_p' in p})]
+            )
+        return run_id
+
+    def add_pass(self, run_id, number, points, raw_points, verdict=None):
+        """Store one more soak pass of a run, every pass is its own row so a long soak costs the same per pass."""
+        columns, data = pack_columns(points)
+        raw_columns, raw = pack_columns(raw_points)
+        with self._con:
+            self._con.execute(
+                'INSERT INTO run_passes (run_id, pass, columns, data, raw_columns, raw) VALUES (?, ?, ?, ?, ?, ?)',
+                (run_id, number, json.dumps(columns), data, json.dumps(raw_columns), raw)
+            )
+            self._con.execute(
+                'UPDATE runs SET point_count = point_count + ?, verdict = COALESCE(?, verdict) WHERE id = ?',
+                (len(points), verdict, run_id)
+            )
+            self._con.executemany(
+                'INSERT INTO run_powers (run_id, lo_p) SELECT ?, ? '
+                'WHERE NOT EXISTS (SELECT 1 FROM run_powers WHERE lo_p = ? AND run_id = ?)',
+                [(run_id, p, p, run_id) for p in sorted({p['lo_p'] for p in points if 'lo_p' in p})]
+            )
+
+    def _load_passes(self, run_id, first, raw=False):
+        # the runs row holds the first pass, later soak passes follow in run_passes
+        query = 'SELECT raw_columns, raw FROM run_passes' if raw else 'SELECT columns, data FROM run_passes'
+        rows = self._con.execute(f'{query} WHERE run_id = ? ORDER BY pass', (run_id, ))
+        return concat_columns([first] + [unpack_columns(json.loads(c), d) for c, d in rows])
+
+    def find(self, device=None, serial=None, lot=None, operator=None, temperature=None, lo_p=None,
+             verdict=None, since=None, until=None):
+        """Metadata of the matching runs, newest first. `since` and `until` are ISO timestamps."""
+        where = list()
+        args = list()
+        for column, value in [('device', device), ('serial', serial), ('lot', lot), ('operator', operator),
+                              ('temperature', temperature), ('verdict', verdict)]:
+            if value is not None:
+                where.append(f'{column} = ?')
+                args.append(value)
+        if since is not None:
+            where.append('started >= ?')
+            args.append(since)
+        if until is not None:
+            where.append('started < ?')
+            args.append(until)
+        if lo_p is not None:
+            where.append('id IN (SELECT run_id FROM run_powers WHERE lo_p = ?)')
+            args.append(lo_p)
+
+        query = f'SELECT {", ".join(_meta_columns)} FROM runs'
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+        query += ' ORDER BY started DESC'
+        return [dict(zip(_meta_columns, row)) for row in self._con.execute(query, args)]
+
+    def info(self, run_id):
+        row = self._con.execute(
+            'SELECT params, secondary, calibration FROM runs WHERE id = ?', (run_id, )
+        ).fetchone()
+        if row is None:
+            raise LookupError(f'no run {run_id}')
+        return dict(zip(['params', 'secondary', 'calibration'], [json.loads(v) for v in row]))
+
+    def load(self, run_id, version=None):
+        """Processed points of a run as `{column: array}`, the original processing unless a version is given."""
+        if version is None:
+            row = self._con.execute('SELECT columns, data FROM runs WHERE id = ?', (run_id, )).fetchone()
+        else:
+            row = self._con.execute(
+                'SELECT columns, data FROM run_versions WHERE run_id = ? AND version = ?', (run_id, version)
+            ).fetchone()
+        if row is None:
+            raise LookupError(f'no run {run_id} version {version}')
+        columns = unpack_columns(json.loads(row[0]), row[1])
+        return self._load_passes(run_id, columns) if version is None else columns
+
+    def add_versions(self, versions, inputs):
+        """Store re-processed points, `versions` is `[(run_id, points), ...]`, returns the new version numbers."""
+        created = datetime.datetime.now().isoformat()
+        numbers = list()
+        with self._con:
+            for run_id, points in versions:
+                version = self._con.execute(
+                    'SELECT COALESCE(MAX(version), 0) + 1 FROM run_versions WHERE run_id = ?', (run_id, )
+                ).fetchone()[0]
+                columns, data = pack_columns(points)
+                self._con.execute(
+                    'INSERT INTO run_versions (run_id, version, created, inputs, columns, data) VALUES (?, ?, ?, ?, ?, ?)',
+                    (run_id, version, created, json.dumps(inputs, ensure_ascii=False), json.dumps(columns), data)
+                )
+                numbers.append(version)
+        return numbers
+
+    def versions(self, run_id):
+        return [
+            {'version': v, 'created': c, 'inputs': json.loads(i)}
+            for v, c, i in self._con.execute(
+                'SELECT version, created, inputs FROM run_versions WHERE run_id = ? ORDER BY version', (run_id, )
+            )
+        ]
+
+    def load_raw(self, run_id):
+        """Raw instrument points of a run in the form the sweep produced them."""
+        row = self._con.execute('SELECT raw_columns, raw FROM runs WHERE id = ?', (run_id, )).fetchone()
+        if row is None:
+            raise LookupError(f'no run {run_id}')
+        columns = self._load_passes(run_id, unpack_columns(json.loads(row[0]), row[1]), raw=True)
+        count = len(next(iter(columns.values()))) if columns else 0
+        return [
+            {
+                k: int(v[i]) if k in _int_columns else float(v[i])
+                for k, v in columns.items() if not np.isnan(v[i])
+            }
+            for i in range(count)
+        ]
@@ -0,0 +1,105 @@
+from contextlib import contextmanager, nullcontext
+
+
+class _BatchingInstrument:
+    def __init__(self, name, instrument, batcher):
+        self._name = name
+        self._instrument = instrument
+        self._batcher = batcher
+        self._pending = list()
+
+    def __getattr__(self, item):
+        return getattr(self._instrument, item)
+
+    def send(self, command):
+        if not self._batcher.collecting:
+            return self._instrument.send(command)
+        self._pending.append(command)
+        self._batcher.mark(self)
+
+    def query(self, command):
+        # whatever was written before the query, to any instrument, has to be in effect
+        self._batcher.flush()
+        return self._instrument.query(command)
+
+    def flush(self):
+        if not self._pending:
+            return
+        for compound in _join(self._pending, self._batcher.limit):
+            self._instrument.send(compound)
+        self._pending.clear()
+
+        if self._batcher.check_errors:
+            error = self._instrument.query('SYST:ERR?').strip()
+            if not error.lstrip('+').startswith('0,'):
+                print(f'{self._name} error after batch: {error}')
+
+
+def _join(commands, limit):
+    # every command after the first starts from the root of the command tree, so relative
+    # headers like SOUR:FREQ after SOUR:POW are not taken as SOUR:SOUR:FREQ
+    chunks = list()
+    chunk = ''
+    for command in commands:
+        if chunk:
+            part = command if command.startswith((':', '*')) else f':{command}'
+            if len(chunk) + 1 + len(part) <= limit:
+                chunk = f'{chunk};{part}'
+                continue
+            chunks.append(chunk)
+        chunk = command
+    chunks.append(chunk)
+    return chunks
+
+
+class NullBatcher:
+    collecting = False
+
+    def wrap(self, name, instrument):
+        return instrument
+
+    def collect(self):
+        return nullcontext()
+
+    def flush(self):
+        pass
+
+
+class ScpiBatcher:
+    """Gathers writes made inside collect() into semicolon-joined compound commands, one per instrument.
+
+    Pending writes of all instruments go out when the outermost collect() ends, before any query
+    and before a settle wait, `SYST:ERR?` is checked once per flushed batch.
+    """
+
+    def __init__(self, limit=256, check_errors=True):
+        self.limit = limit
+        self.check_errors = check_errors
+        self._depth = 0
+        self._dirty = list()
+
+    @property
+    def collecting(self):
+        return self._depth > 0
+
+    def wrap(self, name, instrument):
+        return _BatchingInstrument(name, instrument, self)
+
+    def mark(self, instrument):
+        if instrument not in self._dirty:
+            self._dirty.append(instrument)
+
+    @contextmanager
+    def collect(self):
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if not self._depth:
+                self.flush()
+
+    def flush(self):
+        dirty, self._dirty = self._dirty, list()
+        for instrument in dirty:
+            instrument.flush()
@@ -0,0 +1,149 @@
+import datetime
+import glob
+import gzip
+import json
+import os
+import re
+import time
+
+from collections import defaultdict, deque
+
+
+# trace file: gzipped JSON lines, header object first, then one
+# [t, instrument, op, command, response, duration] list per exchange
+
+
+class _RecordingInstrument:
+    def __init__(self, name, instrument, recorder):
+        self._name = name
+        self._instrument = instrument
+        self._recorder = recorder
+
+    def __getattr__(self, item):
+        return getattr(self._instrument, item)
+
+    def send(self, command):
+        start = time.perf_counter()
+        res = self._instrument.send(command)
+        self._recorder.add(start, self._name, 'w', command, None)
+        return res
+
+    def query(self, command):
+        start = time.perf_counter()
+        res = self._instrument.query(command)
+        self._recorder.add(start, self._name, 'q', command, res)
+        return res
+
+
+class NullRecorder:
+    def wrap(self, name, instrument):
+        return instrument
+
+    def close(self):
+        pass
+
+
+class TraceRecorder:
+    def __init__(self, header=None, path='trace', max_entries=None):
+        self._path = path
+        self._header = dict(header or {})
+        self._header['started'] = datetime.datetime.now().isoformat()
+        self._entries = list()
+        self._started = time.perf_counter()
+        # long runs write the trace out in parts of max_entries exchanges instead of holding all of it
+        self._max_entries = max_entries
+        self._part = 0
+
+    def wrap(self, name, instrument):
+        return _RecordingInstrument(name, instrument, self)
+
+    def add(self, start, name, op, command, response):
+        now = time.perf_counter()
+        self._entries.append([round(start - self._started, 6), name, op, command, response, round(now - start, 6)])
+        if self._max_entries and len(self._entries) >= self._max_entries:
+            self.close()
+
+    def close(self):
+        if not self._entries:
+            return
+        if not os.path.isdir(self._path):
+            os.makedirs(self._path)
+        part = f'.{self._part:03}' if self._max_entries else ''
+        self._part += 1
+        file_name = f'./{self._path}/{self._header["started"].replace(":", ".")}{part}.trace.gz'
+        with gzip.open(file_name, mode='wt', encoding='utf-8') as f:
+            f.write(json.dumps(self._header, ensure_ascii=False) + '\n')
+            for entry in self._entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        print(f'trace saved to {file_name}, {len(self._entries)} exchanges')
+        self._entries.clear()
+
+
+class _ReplayInstrument:
+    def __init__(self, name, replay):
+        self._name = name
+        self._replay = replay
+        self.addr = name
+        self.status = f'replay {name}'
+
+    def send(self, command):
+        self._replay.next(self._name, 'w', command)
+
+    def query(self, command):
+        return self._replay.next(self._name, 'q', command)
+
+
+_part = re.compile(r'^(.*)\.\d{3}\.trace\.gz$')
+
+
+class TraceReplay:
+    def __init__(self, file_name, realtime=False):
+        """`file_name` is a trace file or the list of the parts of one trace, in order."""
+        self._realtime = realtime
+        self._queues = defaultdict(deque)
+
+        file_names = [file_name] if isinstance(file_name, str) else list(file_name)
+        for file_name in file_names:
+            with gzip.open(file_name, mode='rt', encoding='utf-8') as f:
+                # every part repeats the header of the run
+                self.header = json.loads(f.readline())
+                for line in f:
+                    t, name, op, command, response, duration = json.loads(line)
+                    self._queues[name].append((t, op, command, response, duration))
+
+        self._started = None
+        print(f'replaying {", ".join(file_names)}')
+
+    @classmethod
+    def latest(cls, path='trace', realtime=False):
+        traces = sorted(glob.glob(os.path.join(path, '*.trace.gz')))
+        if not traces:
+            raise RuntimeError(f'no traces to replay in {path}')
+        # a trace written in parts replays from its first part on
+        match = _part.match(traces[-1])
+        if match:
+            return cls([t for t in traces if _part.sub(r'\1', t) == match.group(1)], realtime=realtime)
+        return cls(traces[-1], realtime=realtime)
+
+    def instrument(self, name):
+        return _ReplayInstrument(name, self)
+
+    def next(self, name, op, command):
+        try:
+            t, rec_op, rec_command, response, duration = self._queues[name].popleft()
+        except IndexError:
+            raise RuntimeError(f'replay exhausted on {name}: got {op} "{command}"')
+        if (rec_op, rec_command) != (op, command):
+            raise RuntimeError(f'replay mismatch on {name}: expected {rec_op} "{rec_command}", got {op} "{command}"')
+
+        if self._realtime:
+            if self._started is None:
+                self._started = time.perf_counter() - t
+            delay = self._started + t + duration - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return response
+
+    @property
+    def remaining(self):
+        return sum(len(q) for q in self._queues.values())
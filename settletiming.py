@@ -0,0 +1,84 @@
+import bisect
+import datetime
+import time
+
+from instr.const import GIGA
+
+
+# settle after a transition, the guesses the sweep used before characterization
+default_delays = {
+    'retune': 0.6,     # LO generator power/frequency step
+    'analyzer': 1.0,   # analyzer center frequency step
+    'marker': 0.01,    # marker move between tones
+}
+
+# upper band edges, the 0.05-6 GHz range is split where the generators switch their synthesis paths
+band_edges = [0.25 * GIGA, 0.5 * GIGA, 1 * GIGA, 2 * GIGA, 3.2 * GIGA, 4.5 * GIGA, 6 * GIGA]
+
+
+def band_of(freq):
+    return min(bisect.bisect_left(band_edges, freq), len(band_edges) - 1)
+
+
+def timing_identity(idns, secondary):
+    # analyzer averaging changes how long a reading takes to converge as much as the hardware does
+    return {
+        'idn': dict(idns),
+        'sa_avg_state': secondary['sa_avg_state'],
+        'sa_avg_count': secondary['sa_avg_count'],
+    }
+
+
+class TimingProfile:
+    def __init__(self, identity=None, delays=None, created=None):
+        self.identity = identity or {}
+        self.delays = delays or {}
+        self.created = created
+
+    def __bool__(self):
+        return bool(self.delays)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('identity'), data.get('delays'), data.get('created'))
+
+    def to_dict(self):
+        return {
+            'created': self.created,
+            'identity': self.identity,
+            'delays': self.delays,
+        }
+
+    def matches(self, identity):
+        return bool(self) and self.identity == identity
+
+    def delay(self, transition, freq):
+        return self.delays.get(transition, {}).get(band_of(freq), default_delays[transition])
+
+    def set(self, transition, band, seconds):
+        self.delays.setdefault(transition, {})[band] = round(seconds, 4)
+        self.created = datetime.datetime.now().isoformat()
+
+
+def convergence_time(read, target, tolerance, limit, stable=3, step=0.005):
+    """Seconds from now until `stable` consecutive readings stay within `tolerance` of `target`.
+
+    Must be called right after the transition, the first reading is taken immediately.
+    Returns `limit` if the readings do not converge by then.
+    """
+    start = time.perf_counter()
+    settled_at = None
+    count = 0
+    while True:
+        elapsed = time.perf_counter() - start
+        if abs(read() - target) <= tolerance:
+            if not count:
+                settled_at = elapsed
+            count += 1
+            if count == stable:
+                return settled_at
+        else:
+            count = 0
+        if elapsed > limit:
+            return limit
+        time.sleep(step)
@@ -0,0 +1,138 @@
+import csv
+import datetime
+import math
+import os
+import time
+
+from collections import deque
+
+
+class DecimatedHistory:
+    """Fixed size time series, full resolution for the newest samples, coarser further back.
+
+    Every tier holds at most `size` samples, each `factor` samples falling out of a tier are
+    averaged into one sample of the next, so `levels` tiers cover size * factor ** (levels - 1)
+    samples in `levels * size` memory.
+    """
+
+    def __init__(self, size=512, levels=4, factor=8):
+        self._factor = factor
+        self._tiers = [deque(maxlen=size) for _ in range(levels)]
+        self._carry = [list() for _ in range(levels)]
+
+    def add(self, t, value):
+        self._push(0, t, value)
+
+    def _push(self, level, t, value):
+        tier = self._tiers[level]
+        if len(tier) == tier.maxlen and level + 1 < len(self._tiers):
+            carry = self._carry[level]
+            carry.append(tier[0])
+            if len(carry) == self._factor:
+                self._push(level + 1, sum(c[0] for c in carry) / len(carry), sum(c[1] for c in carry) / len(carry))
+                carry.clear()
+        tier.append((t, value))
+
+    def series(self):
+        """Times and values, oldest first."""
+        points = list()
+        for level in reversed(range(len(self._tiers))):
+            points.extend(self._tiers[level])
+            if level:
+                # fell out of the finer tier, not averaged into this one yet
+                points.extend(self._carry[level - 1])
+        return [p[0] for p in points], [p[1] for p in points]
+
+
+class DriftStats:
+    """Online mean, sigma and least squares slope of a value over time."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._mean_t = 0.0
+        self._m2_t = 0.0
+        self._c_tx = 0.0
+
+    def add(self, t, value):
+        # Welford updates, the covariance term gives the regression slope without keeping samples
+        self.count += 1
+        dt = t - self._mean_t
+        dx = value - self.mean
+        self._mean_t += dt / self.count
+        self.mean += dx / self.count
+        self._m2_t += dt * (t - self._mean_t)
+        self._m2 += dx * (value - self.mean)
+        self._c_tx += dt * (value - self.mean)
+
+    @property
+    def sigma(self):
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    @property
+    def slope(self):
+        return self._c_tx / self._m2_t if self._m2_t > 0 else 0.0
+
+
+class SoakMonitor:
+    """Drift tracking of a repeated sweep with memory bounded regardless of run length.
+
+    Every point goes to the stream file at full resolution, per grid point drift stats are kept
+    online, the live history holds the per pass mean of each parameter.
+    """
+
+    def __init__(self, params, path='soak', size=512, levels=4, factor=8):
+        self.params = list(params)
+        self.history = {p: DecimatedHistory(size, levels, factor) for p in self.params}
+        self.drift = dict()
+        self.passes = 0
+
+        self._started = time.monotonic()
+        self._sums = {p: [0.0, 0] for p in self.params}
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.file_name = f'./{path}/soak-{datetime.datetime.now().isoformat().replace(":", ".")}.csv'
+        self._file = open(self.file_name, mode='wt', encoding='utf-8', newline='')
+        self._writer = None
+
+    @property
+    def hours(self):
+        return (time.monotonic() - self._started) / 3600
+
+    def add(self, report):
+        t = self.hours
+        if self._writer is None:
+            self._writer = csv.DictWriter(self._file, fieldnames=['t_h', 'pass'] + list(report), extrasaction='ignore')
+            self._writer.writeheader()
+        self._writer.writerow({'t_h': round(t, 6), 'pass': self.passes, **report})
+
+        for p in self.params:
+            if p not in report:
+                continue
+            self.drift.setdefault((p, report['lo_p'], report['lo_f']), DriftStats()).add(t, report[p])
+            self._sums[p][0] += report[p]
+            self._sums[p][1] += 1
+
+    def end_pass(self):
+        t = self.hours
+        for p, (total, count) in self._sums.items():
+            if count:
+                self.history[p].add(t, total / count)
+        self._sums = {p: [0.0, 0] for p in self.params}
+        self.passes += 1
+        self._file.flush()
+
+    def worst_drift(self):
+        """Grid point with the steepest slope per parameter, `{param: ((lo_p, lo_f), stats)}`."""
+        worst = dict()
+        for (p, lo_p, lo_f), stats in self.drift.items():
+            if p not in worst or abs(stats.slope) > abs(worst[p][1].slope):
+                worst[p] = ((lo_p, lo_f), stats)
+        return worst
+
+    def close(self):
+        self.end_pass()
+        self._file.close()
+        print(f'soak data saved to {self.file_name}')
@@ -0,0 +1,46 @@
+import pyqtgraph as pg
+
+from PyQt5.QtWidgets import QGridLayout, QWidget
+
+from measureresult import column_labels
+from primaryplotwidget import colors
+
+
+class SoakPlotWidget(QWidget):
+    label_style = {'color': 'k', 'font-size': '15px'}
+
+    def __init__(self, parent=None, controller=None):
+        super().__init__(parent)
+
+        self._controller = controller
+
+        self._grid = QGridLayout()
+        self._win = pg.GraphicsLayoutWidget(show=True)
+        self._win.setBackground('w')
+        self._grid.addWidget(self._win, 0, 0)
+        self.setLayout(self._grid)
+
+        self._plots = dict()
+        self._curves = dict()
+
+    def clear(self):
+        self._win.clear()
+        self._plots.clear()
+        self._curves.clear()
+
+    def plot(self):
+        soak = self._controller.result.soak
+        if soak is None:
+            return
+
+        for i, param in enumerate(soak.params):
+            if param not in self._plots:
+                plot = self._win.addPlot(row=i, col=0)
+                plot.setLabel('left', column_labels.get(param, param), **self.label_style)
+                plot.setLabel('bottom', 't, ч', **self.label_style)
+                plot.showGrid(x=True, y=True)
+                self._plots[param] = plot
+                self._curves[param] = plot.plot(pen=pg.mkPen(color=colors[i], width=2))
+
+            # the history is bounded, redrawing it whole costs the same at any run length
+            self._curves[param].setData(*soak.history[param].series())
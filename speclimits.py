@@ -0,0 +1,131 @@
+import math
+import os
+import re
+
+from measureresult import column_labels
+
+
+def _normalize(label):
+    return re.sub(r'[\s.,]', '', str(label)).lower()
+
+
+_keys_by_label = {_normalize(v): k for k, v in column_labels.items()}
+
+
+class SpecLimits:
+    def __init__(self, limits=None):
+        self._limits = dict(limits or {})
+
+    def __bool__(self):
+        return bool(self._limits)
+
+    def __str__(self):
+        return f'{self._limits}'
+
+    @classmethod
+    def from_table(cls, table_file):
+        # result table layout: header row, then span, step and mean rows, first column holds row labels
+        if not os.path.isfile(table_file):
+            return cls()
+
+        import openpyxl
+
+        wb = openpyxl.load_workbook(table_file)
+        ws = wb.active
+        rows = list(ws.rows)
+
+        limits = dict()
+        for j in range(1, ws.max_column):
+            header = rows[0][j].value
+            key = _keys_by_label.get(_normalize(header), header)
+            try:
+                span, _, mean = [float(rows[i][j].value) for i in range(1, 4)]
+            except (TypeError, ValueError, IndexError):
+                continue
+            limits[key] = (mean - span, mean + span)
+        return cls(limits)
+
+    def get(self, key, default=None):
+        return self._limits.get(key, default)
+
+    def excess(self, report):
+        # how far each limited value lies outside its window, negative inside
+        return {
+            k: max(lo - report[k], report[k] - hi)
+            for k, (lo, hi) in self._limits.items() if k in report
+        }
+
+    def margin(self, report):
+        # smallest distance to a limit normalized by window width, small values are close to failing
+        margins = [
+            -e / (hi - lo) if hi > lo else -e
+            for e, (lo, hi) in (
+                (e, self._limits[k]) for k, e in self.excess(report).items()
+            )
+        ]
+        return min(margins) if margins else math.inf
+
+
+class ProductionJudge:
+    def __init__(self, limits, sigma, confidence):
+        self._limits = limits
+        self._sigma = sigma
+        self._risk = 1.0 - confidence
+        self._p_all_pass = 1.0
+        self.failures = list()
+        self.verdict = None
+
+    def judge(self, report):
+        """Return abort reason once the DUT is a certain fail, None otherwise."""
+        for key, excess in self._limits.excess(report).items():
+            if excess <= 0:
+                continue
+
+            p_pass = _p_inside(excess, self._sigma)
+            self.failures.append((report.get('lo_p'), report.get('lo_f'), key, report[key]))
+
+            if p_pass < self._risk:
+                return self._fail(f'{key}={report[key]} вне допуска при Pгет={report.get("lo_p")}, Fгет={report.get("lo_f")}')
+
+            self._p_all_pass *= p_pass
+            if self._p_all_pass < self._risk:
+                return self._fail(f'{len(self.failures)} точек вне допуска')
+        return None
+
+    def _fail(self, reason):
+        self.verdict = f'Не годен: {reason}'
+        return reason
+
+    def finish(self):
+        """Verdict of a completed sweep: a point measured outside the limits is never a pass."""
+        if self.verdict is None:
+            # outside the limits but within the measurement uncertainty, the DUT has to be measured again
+            self.verdict = f'Перепроверить: {len(self.failures)} точек вне допуска' if self.failures else 'Годен'
+        return self.verdict
+
+
+def _p_inside(excess, sigma):
+    # probability that the true value is still inside the limit given the measurement uncertainty
+    if sigma <= 0:
+        return 0.0
+    return 0.5 * math.erfc(excess / (sigma * math.sqrt(2)))
+
+
+def screening_order(points, limits, reference):
+    """Order grid points so the most discriminating ones come first.
+
+    `points` are (lo_p, lo_f) pairs, `reference` maps the same pairs to processed
+    reports of a previous DUT. Points are ranked by their margin to the limits on the
+    reference; without a reference band edges go first, they fail most often.
+    """
+    if reference and limits:
+        def rank(i):
+            return limits.margin(reference.get(points[i], {}))
+    else:
+        freqs = [f for _, f in points]
+        centre = (min(freqs) + max(freqs)) / 2 if freqs else 0
+
+        def rank(i):
+            return -abs(points[i][1] - centre)
+
+    return sorted(range(len(points)), key=rank)
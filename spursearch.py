@@ -0,0 +1,111 @@
+import csv
+import datetime
+import os
+
+import numpy as np
+
+
+def acquire_trace(sa, start, stop, points):
+    """One single sweep from `start` to `stop` Hz, frequencies and levels as arrays."""
+    sa.send(f':SENS:FREQ:STAR {start}Hz')
+    sa.send(f':SENS:FREQ:STOP {stop}Hz')
+    sa.query(':INIT:IMM;*OPC?')
+    levels = np.array(sa.query(':TRAC:DATA? TRACE1').split(','), dtype=np.float64)
+    return np.linspace(start, stop, len(levels)), levels
+
+
+def find_peaks(freqs, levels, threshold, min_spacing):
+    """Local maxima more than `threshold` dB above the median noise floor of the trace.
+
+    Peaks closer than `min_spacing` Hz are one peak, the strongest of them is kept.
+    """
+    floor = np.median(levels)
+    inner = levels[1:-1]
+    is_peak = (inner > levels[:-2]) & (inner >= levels[2:]) & (inner > floor + threshold)
+    idx = np.flatnonzero(is_peak) + 1
+    if not len(idx):
+        return np.empty(0), np.empty(0), floor
+
+    # strongest first, drop every peak that falls within min_spacing of a stronger one
+    idx = idx[np.argsort(levels[idx])[::-1]]
+    close = np.abs(freqs[idx][:, None] - freqs[idx][None, :]) < min_spacing
+    keep = np.ones(len(idx), dtype=bool)
+    for i in range(len(idx)):
+        if keep[i]:
+            keep[i + 1:] &= ~close[i, i + 1:]
+    idx = np.sort(idx[keep])
+    return freqs[idx], levels[idx], floor
+
+
+def classify(freqs, f_lo, f_mod, tolerance, n_max=5, m_max=7):
+    """Nearest n*Flo + m*Fmod product for every frequency, None where nothing is within tolerance."""
+    n, m = np.meshgrid(np.arange(n_max + 1), np.arange(-m_max, m_max + 1), indexing='ij')
+    products = (n * f_lo + m * f_mod).ravel()
+    n, m = n.ravel(), m.ravel()
+    valid = products > 0
+    products, n, m = products[valid], n[valid], m[valid]
+
+    distance = np.abs(np.asarray(freqs)[:, None] - products[None, :])
+    nearest = np.argmin(distance, axis=1)
+    labels = list()
+    for i, j in enumerate(nearest):
+        if distance[i, j] > tolerance:
+            labels.append(None)
+        else:
+            labels.append(_product_label(n[j], m[j]))
+    return labels
+
+
+def _product_label(n, m):
+    lo = '' if n == 0 else ('Flo' if n == 1 else f'{n}·Flo')
+    if m == 0:
+        return lo
+    mod = 'Fmod' if abs(m) == 1 else f'{abs(m)}·Fmod'
+    if not lo:
+        return mod
+    return f'{lo}{"+" if m > 0 else "-"}{mod}'
+
+
+class SpurTable:
+    """Spurs of one run, analysed off the sweep thread and written to spurs/spurs-<ts>.csv."""
+
+    fields = ['lo_p', 'lo_f', 'freq', 'level', 'above_floor', 'product']
+
+    def __init__(self, threshold, tolerance, min_spacing, path='spurs'):
+        self._threshold = threshold
+        self._tolerance = tolerance
+        self._min_spacing = min_spacing
+        self.rows = list()
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.file_name = f'./{path}/spurs-{datetime.datetime.now().isoformat().replace(":", ".")}.csv'
+        self._file = open(self.file_name, mode='wt', encoding='utf-8', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=self.fields)
+        self._writer.writeheader()
+
+    def analyze(self, lo_p, lo_f, f_carrier, f_mod, traces):
+        freqs = np.concatenate([f for f, _ in traces])
+        levels = np.concatenate([l for _, l in traces])
+        peak_freqs, peak_levels, floor = find_peaks(freqs, levels, self._threshold, self._min_spacing)
+        labels = classify(peak_freqs, f_carrier, f_mod, self._tolerance)
+
+        rows = [
+            {
+                'lo_p': lo_p,
+                'lo_f': lo_f,
+                'freq': round(float(f), 1),
+                'level': round(float(level), 2),
+                'above_floor': round(float(level - floor), 2),
+                'product': label or 'unknown',
+            }
+            for f, level, label in zip(peak_freqs, peak_levels, labels)
+        ]
+        self._writer.writerows(rows)
+        self.rows.extend(rows)
+        unknown = sum(1 for r in rows if r['product'] == 'unknown')
+        print(f'spurs at {lo_p} dBm {lo_f} Hz: {len(rows)} peaks, {unknown} unknown')
+
+    def close(self):
+        self._file.close()
+        print(f'spur table saved to {self.file_name}')
@@ -0,0 +1,68 @@
+import queue
+import threading
+
+
+class InlinePipeline:
+    """Processes every point on the sweep thread before the next one is started."""
+
+    def __init__(self, process, profiler):
+        self._process = process
+        self._profiler = profiler
+        self.stopped = False
+
+    def submit(self, *point):
+        # once stopped, like the threaded pipeline, later points are dropped
+        if self.stopped:
+            return
+        with self._profiler.phase('process'):
+            self.stopped = bool(self._process(*point))
+
+    def close(self):
+        pass
+
+    def check(self):
+        pass
+
+
+class SweepPipeline:
+    """Processes points on a worker thread behind the sweep.
+
+    A point's instrument stages (retune, analyzer, readout, current) stay on the sweep thread and in
+    order, they all depend on the DUT state the previous stage left. Processing depends only on the
+    captured readings, so the next point's retune starts as soon as they are submitted.
+    `process` returns True to stop the sweep, points submitted after that are dropped.
+    """
+
+    def __init__(self, process, depth=16):
+        self._process = process
+        self._queue = queue.Queue(maxsize=depth)
+        self._error = None
+        self.stopped = False
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            point = self._queue.get()
+            if point is None:
+                return
+            if self.stopped or self._error is not None:
+                continue
+            try:
+                self.stopped = bool(self._process(*point))
+            except Exception as ex:
+                self._error = ex
+
+    def check(self):
+        if self._error is not None:
+            raise RuntimeError(f'point processing failed: {self._error}') from self._error
+
+    def submit(self, *point):
+        self.check()
+        self._queue.put(point)
+
+    def close(self):
+        # everything already captured is still processed
+        self._queue.put(None)
+        self._thread.join()
@@ -0,0 +1,174 @@
+import datetime
+import math
+import os
+import time
+
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+
+class _Stat:
+    __slots__ = ('count', 'total', 'min', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.buckets = defaultdict(int)
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        self.min = min(self.min, elapsed)
+        self.max = max(self.max, elapsed)
+        # power of two millisecond buckets: <=1ms, <=2ms, <=4ms ...
+        self.buckets[max(0, math.ceil(math.log2(elapsed * 1000))) if elapsed > 0 else 0] += 1
+
+    def __str__(self):
+        hist = ' '.join(f'≤{2 ** b}ms:{n}' for b, n in sorted(self.buckets.items()))
+        return f'n={self.count:<6} total={self.total:8.3f}s mean={self.total / self.count * 1000:8.2f}ms ' \
+               f'min={self.min * 1000:8.2f}ms max={self.max * 1000:8.2f}ms   {hist}'
+
+
+class _ProfiledInstrument:
+    def __init__(self, name, instrument, profiler):
+        self._name = name
+        self._instrument = instrument
+        self._profiler = profiler
+
+    def __getattr__(self, item):
+        return getattr(self._instrument, item)
+
+    def send(self, command):
+        start = time.perf_counter()
+        try:
+            return self._instrument.send(command)
+        finally:
+            self._profiler.add_command(self._name, command, time.perf_counter() - start)
+
+    def query(self, command):
+        start = time.perf_counter()
+        try:
+            return self._instrument.query(command)
+        finally:
+            self._profiler.add_command(self._name, command, time.perf_counter() - start)
+
+
+def _header(command):
+    # SCPI header without arguments, so all SOUR:FREQ writes land in one bucket
+    return command.strip().split(' ', 1)[0]
+
+
+class NullProfiler:
+    def wrap(self, name, instrument):
+        return instrument
+
+    def phase(self, name):
+        return nullcontext()
+
+    def point_done(self):
+        pass
+
+    def dump(self, path='profile'):
+        pass
+
+
+class PhaseTimer(NullProfiler):
+    """Phase totals only, no instrument wrapping, cheap enough to run on every sweep."""
+
+    def __init__(self):
+        self._phases = defaultdict(float)
+        self._nested = list()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        self._nested.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            own = elapsed - self._nested.pop()
+            if self._nested:
+                self._nested[-1] += elapsed
+            self._phases[name] += own
+
+    def phase_totals(self):
+        return dict(self._phases)
+
+
+class SweepProfiler:
+    def __init__(self, live=False):
+        self._live = live
+        self._commands = defaultdict(_Stat)
+        self._instruments = defaultdict(_Stat)
+        self._phases = defaultdict(_Stat)
+        self._points = _Stat()
+        self._point_phases = defaultdict(float)
+        self._nested = list()
+
+        self._started = time.perf_counter()
+        self._point_started = self._started
+
+    def wrap(self, name, instrument):
+        return _ProfiledInstrument(name, instrument, self)
+
+    def add_command(self, instrument, command, elapsed):
+        self._commands[(instrument, _header(command))].add(elapsed)
+        self._instruments[instrument].add(elapsed)
+
+    @contextmanager
+    def phase(self, name):
+        # phases are exclusive: time spent in a nested phase is not counted in the outer one
+        start = time.perf_counter()
+        self._nested.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            own = elapsed - self._nested.pop()
+            if self._nested:
+                self._nested[-1] += elapsed
+            self._phases[name].add(own)
+            self._point_phases[name] += own
+
+    def point_done(self):
+        now = time.perf_counter()
+        elapsed = now - self._point_started
+        self._points.add(elapsed)
+        if self._live:
+            phases = ' '.join(f'{k}={v * 1000:.0f}ms' for k, v in self._point_phases.items())
+            print(f'point #{self._points.count}: {elapsed * 1000:.0f}ms   {phases}')
+        self._point_phases.clear()
+        self._point_started = now
+
+    def phase_totals(self):
+        return {k: v.total for k, v in self._phases.items()}
+
+    @property
+    def report(self):
+        lines = [
+            f'total: {time.perf_counter() - self._started:.3f}s',
+            f'points: {self._points}' if self._points.count else 'points: none',
+            '',
+            'phases:',
+            *[f'  {k:<12} {v}' for k, v in sorted(self._phases.items(), key=lambda kv: -kv[1].total)],
+            '',
+            'instruments:',
+            *[f'  {k:<12} {v}' for k, v in sorted(self._instruments.items(), key=lambda kv: -kv[1].total)],
+            '',
+            'commands:',
+            *[f'  {i:<12} {c:<32} {v}' for (i, c), v in sorted(self._commands.items(), key=lambda kv: -kv[1].total)],
+        ]
+        return '\n'.join(lines)
+
+    def dump(self, path='profile'):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        file_name = f'./{path}/sweep-{datetime.datetime.now().isoformat().replace(":", ".")}.txt'
+        report = self.report
+        with open(file_name, mode='wt', encoding='utf-8') as f:
+            f.write(report)
+        print(report)
+        print(f'profile saved to {file_name}')
@@ -0,0 +1,106 @@
+import ast
+import math
+import sys
+
+
+tone_fields = ['sa_p_out', 'sa_p_carr', 'sa_p_sb', 'sa_p_3_harm']
+
+
+def zero_span_settings(mod_f):
+    """RBW and sweep time for reading tones `mod_f` apart.
+
+    RBW is the largest 1-3-10 step at least ten times narrower than the tone spacing, so the
+    neighbouring tone is well down the filter skirt, the sweep covers 20 filter time constants.
+    """
+    steps = [m * 10 ** e for e in range(8) for m in [1, 3]]
+    rbw = max([step for step in steps if step <= mod_f / 10], default=1)
+    return rbw, max(1e-3, 20 / rbw)
+
+
+class CachedSettings:
+    """Sends a setting only when its value differs from what the instrument already has."""
+
+    def __init__(self, instrument):
+        self._instrument = instrument
+        self._values = dict()
+
+    def set(self, command, value, unit=''):
+        if self._values.get(command) == value:
+            return False
+        self._instrument.send(f'{command} {value}{unit}')
+        self._values[command] = value
+        return True
+
+    def forget(self):
+        self._values.clear()
+
+
+class ZeroSpanReader:
+    """Reads tone powers one at a time with the analyzer in zero span and single sweep."""
+
+    def __init__(self, sa, mod_f):
+        self._sa = sa
+        self._settings = CachedSettings(sa)
+        self.rbw, self.sweep_time = zero_span_settings(mod_f)
+
+    def setup(self):
+        self._settings.set(':SENS:FREQ:SPAN', 0, 'Hz')
+        self._settings.set(':SENS:BAND:RES', self.rbw, 'Hz')
+        self._settings.set(':SENS:SWE:TIME', self.sweep_time, 's')
+        self._settings.set(':INIT:CONT', 'OFF')
+        self._settings.set('AVER', 'OFF')
+        # marker in the middle of the record, past the filter settling
+        self._settings.set(':CALC:MARK1:X', self.sweep_time / 2, 's')
+
+    def reset(self):
+        # something else reconfigured the analyzer, send everything again
+        self._settings.forget()
+        self.setup()
+
+    def read(self, freq):
+        self._settings.set(':SENS:FREQ:CENT', freq, 'Hz')
+        self._sa.query(':INIT:IMM;*OPC?')
+        return float(self._sa.query(':CALC:MARK1:Y?'))
+
+    def restore(self, span):
+        self._sa.send(f':SENS:FREQ:SPAN {span}Hz')
+        self._sa.send(':SENS:BAND:RES:AUTO ON')
+        self._sa.send(':SENS:SWE:TIME:AUTO ON')
+        self._sa.send(':INIT:CONT ON')
+        self._settings.forget()
+
+
+def compare(reference, other):
+    """Per tone difference of two runs over the same grid, `{field: (mean, std, max abs)}` in dB.
+
+    Points are matched by LO power and frequency, the ones missing from either run are skipped.
+    """
+    other_points = {(p['lo_p'], p['lo_f']): p for p in other}
+    diffs = {f: list() for f in tone_fields}
+    for point in reference:
+        match = other_points.get((point['lo_p'], point['lo_f']))
+        if match is None:
+            continue
+        for f in tone_fields:
+            diffs[f].append(match[f] - point[f])
+
+    stats = dict()
+    for f, values in diffs.items():
+        if not values:
+            continue
+        mean = sum(values) / len(values)
+        std = math.sqrt(sum((v - mean) ** 2 for v in values) / len(values))
+        stats[f] = (mean, std, max(abs(v) for v in values))
+    return stats
+
+
+def _load_points(file_name):
+    with open(file_name, mode='rt', encoding='utf-8') as f:
+        return ast.literal_eval(f.read())
+
+
+if __name__ == '__main__':
+    # python zerospan.py swept_out.txt zero_span_out.txt
+    swept, zero_span = sys.argv[1:3]
+    for field, (mean, std, worst) in compare(_load_points(swept), _load_points(zero_span)).items():
+        print(f'{field:12} mean {mean:+.3f} dB, std {std:.3f} dB, max {worst:.3f} dB')